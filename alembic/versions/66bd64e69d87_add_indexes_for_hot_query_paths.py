@@ -0,0 +1,85 @@
+"""Add a primary key to book_author_association and indexes for the hot query paths
+
+Revision ID: 66bd64e69d87
+Revises: c41d7e9a2b56
+Create Date: 2026-10-18 16:40:12.503187
+
+Indexes are built CONCURRENTLY, outside of the migration transaction, so reads and writes carry on while
+they are built. The primary key is attached to an index built the same way, and the NOT NULL constraints
+it needs are first proven by CHECK constraints validated outside of the transaction too.
+A CONCURRENTLY build that fails leaves an invalid index behind, which has to be dropped before retrying.
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '66bd64e69d87'
+down_revision = 'c41d7e9a2b56'
+branch_labels = None
+depends_on = None
+
+
+INDEXES = [
+    ('ix_book_author_association_author_id', 'book_author_association', ['author_id', 'book_id'], None),
+    ('ix_books_active_id', 'books', ['id'], 'is_active'),
+    ('ix_books_active_title', 'books', ['title', 'id'], 'is_active'),
+    ('ix_authors_name', 'authors', ['name', 'id'], None),
+    ('ix_authors_active_id', 'authors', ['id'], 'is_active'),
+    ('ix_users_active_id', 'users', ['id'], 'is_active'),
+]
+
+
+def upgrade() -> None:
+    # Links can only have been duplicated or left half empty by hand, but either would fail the primary key
+    op.execute("DELETE FROM book_author_association WHERE book_id IS NULL OR author_id IS NULL")
+    op.execute("""
+        DELETE FROM book_author_association a
+        USING book_author_association b
+        WHERE a.ctid < b.ctid AND a.book_id = b.book_id AND a.author_id = b.author_id
+    """)
+    # SET NOT NULL skips its full table scan under an exclusive lock when a valid CHECK already proves it
+    for column in ('book_id', 'author_id'):
+        op.execute(
+            f"ALTER TABLE book_author_association "
+            f"ADD CONSTRAINT ck_book_author_association_{column}_not_null CHECK ({column} IS NOT NULL) NOT VALID"
+        )
+
+    with op.get_context().autocommit_block():
+        for column in ('book_id', 'author_id'):
+            op.execute(
+                f"ALTER TABLE book_author_association VALIDATE CONSTRAINT ck_book_author_association_{column}_not_null"
+            )
+        op.create_index(
+            'book_author_association_pkey',
+            'book_author_association',
+            ['book_id', 'author_id'],
+            unique=True,
+            postgresql_concurrently=True,
+        )
+        for name, table, columns, where in INDEXES:
+            op.create_index(
+                name,
+                table,
+                columns,
+                postgresql_where=sa.text(where) if where else None,
+                postgresql_concurrently=True,
+            )
+
+    for column in ('book_id', 'author_id'):
+        op.alter_column('book_author_association', column, existing_type=sa.Integer(), nullable=False)
+        op.drop_constraint(f'ck_book_author_association_{column}_not_null', 'book_author_association', type_='check')
+    op.execute(
+        "ALTER TABLE book_author_association "
+        "ADD CONSTRAINT book_author_association_pkey PRIMARY KEY USING INDEX book_author_association_pkey"
+    )
+
+
+def downgrade() -> None:
+    op.drop_constraint('book_author_association_pkey', 'book_author_association', type_='primary')
+    with op.get_context().autocommit_block():
+        for name, table, _, _ in reversed(INDEXES):
+            op.drop_index(name, table_name=table, postgresql_concurrently=True)
+    for column in ('author_id', 'book_id'):
+        op.alter_column('book_author_association', column, existing_type=sa.Integer(), nullable=True)
@@ -0,0 +1,54 @@
+"""Add search vectors and trigram indexes to books and authors
+
+Revision ID: c41d7e9a2b56
+Revises: f136640fc70a
+Create Date: 2026-10-18 10:12:41.208517
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = 'c41d7e9a2b56'
+down_revision = 'f136640fc70a'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    op.add_column('books', sa.Column(
+        'search_vector',
+        postgresql.TSVECTOR(),
+        sa.Computed(
+            "setweight(to_tsvector('english', coalesce(title, '')), 'A') || "
+            "setweight(to_tsvector('english', coalesce(description, '')), 'B')",
+            persisted=True,
+        ),
+        nullable=True,
+    ))
+    op.add_column('authors', sa.Column(
+        'search_vector',
+        postgresql.TSVECTOR(),
+        sa.Computed("to_tsvector('simple', coalesce(name, ''))", persisted=True),
+        nullable=True,
+    ))
+    op.create_index('ix_books_search_vector', 'books', ['search_vector'], postgresql_using='gin')
+    op.create_index(
+        'ix_books_title_trgm', 'books', ['title'], postgresql_using='gin', postgresql_ops={'title': 'gin_trgm_ops'}
+    )
+    op.create_index('ix_authors_search_vector', 'authors', ['search_vector'], postgresql_using='gin')
+    op.create_index(
+        'ix_authors_name_trgm', 'authors', ['name'], postgresql_using='gin', postgresql_ops={'name': 'gin_trgm_ops'}
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_authors_name_trgm', table_name='authors')
+    op.drop_index('ix_authors_search_vector', table_name='authors')
+    op.drop_index('ix_books_title_trgm', table_name='books')
+    op.drop_index('ix_books_search_vector', table_name='books')
+    op.drop_column('authors', 'search_vector')
+    op.drop_column('books', 'search_vector')
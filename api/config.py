@@ -9,9 +9,40 @@ load_dotenv(os.path.join(project_root, ".env"))
 class Config:
     DEBUG = True
     SQLALCHEMY_DATABASE_URI = os.getenv("SQLALCHEMY_DATABASE_URI")
+    # Comma-separated read replica URIs; reads go to the primary when empty
+    SQLALCHEMY_REPLICA_URIS = [uri for uri in os.getenv("SQLALCHEMY_REPLICA_URIS", "").split(",") if uri.strip()]
+    REPLICA_MAX_LAG_SECONDS = float(os.getenv("REPLICA_MAX_LAG_SECONDS", 5))
+    REPLICA_CHECK_INTERVAL = float(os.getenv("REPLICA_CHECK_INTERVAL", 5))  # seconds between lag checks
+    READ_YOUR_WRITES_SECONDS = int(os.getenv("READ_YOUR_WRITES_SECONDS", 10))  # primary-only reads after a write
+    DB_ECHO = os.getenv("DB_ECHO", "false").lower() in ("1", "true", "yes")
+    DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", 10))  # connections kept open per worker process
+    DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", 10))
+    DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", 30))  # seconds to wait for a free connection
+    DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", 1800))  # seconds, -1 disables
+    DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() in ("1", "true", "yes")
+    DB_STATEMENT_CACHE_SIZE = int(os.getenv("DB_STATEMENT_CACHE_SIZE", 100))  # 0 behind pgbouncer transaction pooling
     TEST_SQLALCHEMY_DATABASE_URI = os.getenv("TEST_SQLALCHEMY_DATABASE_URI")
     JWT_SECRET_KEY = os.getenv("JWT_SECRET_KEY")
     ACCESS_TOKEN_EXPIRE_MINUTES = 30  # 30 minutes
     REFRESH_TOKEN_EXPIRE_MINUTES = 60 * 24 * 7  # 7 days
     ALGORITHM = "HS256"
     JWT_REFRESH_SECRET_KEY = os.getenv("JWT_REFRESH_SECRET_KEY")    # should be kept secret
+    PAGE_SIZE_DEFAULT = int(os.getenv("PAGE_SIZE_DEFAULT", 50))
+    PAGE_SIZE_MAX = int(os.getenv("PAGE_SIZE_MAX", 500))
+    RELATED_ITEMS_MAX = int(os.getenv("RELATED_ITEMS_MAX", 10))  # related books/authors embedded in each entity
+    EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", 1000))  # rows fetched per round trip of an export cursor
+    IMPORTS_DIR = os.getenv("IMPORTS_DIR", os.path.join(project_root, "imports"))  # shared with the Celery workers
+    IMPORT_BATCH_SIZE = int(os.getenv("IMPORT_BATCH_SIZE", 1000))  # records parsed and written per transaction
+    BULK_MAX_ITEMS = int(os.getenv("BULK_MAX_ITEMS", 5000))  # items per bulk create, update or delete request
+    LOCAL_CACHE_MAX_ENTRIES = int(os.getenv("LOCAL_CACHE_MAX_ENTRIES", 1024))
+    LOCAL_CACHE_MAX_BYTES = int(os.getenv("LOCAL_CACHE_MAX_BYTES", 64 * 1024 * 1024))  # 64 MB
+    HASHING_WORKERS = int(os.getenv("HASHING_WORKERS", os.cpu_count() or 1))
+    HASHING_MAX_QUEUE = int(os.getenv("HASHING_MAX_QUEUE", 64))  # jobs waiting or running before new ones get 503
+    GRAPHQL_DOCUMENT_CACHE_SIZE = int(os.getenv("GRAPHQL_DOCUMENT_CACHE_SIZE", 256))  # parsed/validated operations
+    PERSISTED_QUERY_TTL = int(os.getenv("PERSISTED_QUERY_TTL", 60 * 60 * 24 * 30))  # 30 days since last use
+    GRAPHQL_MAX_DEPTH = int(os.getenv("GRAPHQL_MAX_DEPTH", 10))
+    GRAPHQL_MAX_COST = int(os.getenv("GRAPHQL_MAX_COST", 10000))
+    GRAPHQL_COST_BUDGET = int(os.getenv("GRAPHQL_COST_BUDGET", 100000))  # per client and minute, 0 disables
+    GRAPHQL_LIST_SIZE_ESTIMATE = int(os.getenv("GRAPHQL_LIST_SIZE_ESTIMATE", 10))  # unpaginated list fields
+    GRAPHQL_RESULT_CACHE_TTL = int(os.getenv("GRAPHQL_RESULT_CACHE_TTL", 60))  # default for `@cached` operations
+    GRAPHQL_RESULT_CACHE_MAX_TTL = int(os.getenv("GRAPHQL_RESULT_CACHE_MAX_TTL", 600))
@@ -1,12 +1,67 @@
+import asyncio
+import time
+
+from sqlalchemy import DDL, event
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker
 from sqlalchemy.orm import declarative_base
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 
 from api import fastapi_config
+from api.metrics import DB_POOL_CHECKED_OUT, DB_POOL_CHECKOUT_SECONDS, DB_POOL_WAITING
+
+
+class InstrumentedPool(AsyncAdaptedQueuePool):
+    """Queue pool that reports how long checkouts take and how many are waiting, labelled by its logging name."""
+
+    def _do_get(self):
+        engine = self._orig_logging_name or "primary"
+        # Mirrors QueuePool: a checkout only blocks when no connection is idle and the overflow is used up
+        blocks = -1 < self._max_overflow <= self._overflow and self._pool.empty()
+        if blocks:
+            DB_POOL_WAITING.labels(engine=engine).inc()
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            if blocks:
+                DB_POOL_WAITING.labels(engine=engine).dec()
+            DB_POOL_CHECKOUT_SECONDS.labels(engine=engine).observe(time.perf_counter() - started)
+
+
+def make_engine(url: str, name: str = "primary"):
+    """An engine for `url` using the pool settings from the config; `name` labels its pool metrics."""
+    url = url.replace("postgresql://", "postgresql+asyncpg://")
+    engine = create_async_engine(
+        url,
+        echo=fastapi_config.DB_ECHO,
+        poolclass=InstrumentedPool,
+        pool_logging_name=name,
+        pool_size=fastapi_config.DB_POOL_SIZE,
+        max_overflow=fastapi_config.DB_MAX_OVERFLOW,
+        pool_timeout=fastapi_config.DB_POOL_TIMEOUT,
+        pool_recycle=fastapi_config.DB_POOL_RECYCLE,
+        pool_pre_ping=fastapi_config.DB_POOL_PRE_PING,
+        connect_args={
+            # asyncpg's own statement cache and the dialect's prepared statement cache
+            "statement_cache_size": fastapi_config.DB_STATEMENT_CACHE_SIZE,
+            "prepared_statement_cache_size": fastapi_config.DB_STATEMENT_CACHE_SIZE,
+        },
+    )
+    DB_POOL_CHECKED_OUT.labels(engine=name).set_function(lambda: engine.pool.checkedout())
+    return engine
+
+
+async def warm_pool(engine, size: int = fastapi_config.DB_POOL_SIZE):
+    """Open `size` pooled connections up front, so the first requests don't pay for connecting."""
+    connections = await asyncio.gather(*[engine.connect().start() for _ in range(size)])
+    await asyncio.gather(*[connection.close() for connection in connections])
+
 
-db_url = fastapi_config.SQLALCHEMY_DATABASE_URI.replace("postgresql://", "postgresql+asyncpg://")
-engine = create_async_engine(db_url, echo=True)
+engine = make_engine(fastapi_config.SQLALCHEMY_DATABASE_URI)
 AsyncSessionLocal = async_sessionmaker(engine, expire_on_commit=False)
 Base = declarative_base()
+# Trigram indexes and the similarity() ranking used by search need pg_trgm
+event.listen(Base.metadata, "before_create", DDL("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
 
 
 async def get_session() -> AsyncSession:
@@ -0,0 +1,88 @@
+import base64
+import json
+
+from sqlalchemy import Select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+
+class PaginationError(ValueError):
+    pass
+
+
+def encode_cursor(sort: str, value, row_id: int) -> str:
+    raw = json.dumps({"s": sort, "v": value, "id": row_id}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def _column_type(column) -> type | None:
+    try:
+        return column.type.python_type
+    except NotImplementedError:
+        return None
+
+
+def _has_type(value, value_type: type | None) -> bool:
+    # bool is an int subclass, but never a valid key
+    return value_type is None or (isinstance(value, value_type) and not isinstance(value, bool))
+
+
+def decode_cursor(cursor: str, sort: str, value_type: type | None = None) -> tuple:
+    """Return the (value, id) a cursor points after; `value` must be a `value_type` when one is given."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        data = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        value, row_id = data["v"], data["id"]
+    except (ValueError, KeyError, TypeError):
+        raise PaginationError("Invalid cursor")
+    if data.get("s") != sort:
+        raise PaginationError("Cursor was issued for a different sort order")
+    if not _has_type(row_id, int) or not _has_type(value, value_type):
+        raise PaginationError("Invalid cursor")
+    return value, row_id
+
+
+def sort_column(columns: dict, sort: str):
+    """Resolve a `sort` parameter like "title" or "-title" to (name, column, descending)."""
+    name = sort.lstrip("-")
+    if name not in columns:
+        raise PaginationError(f"Unsupported sort key '{name}'. Use one of: {', '.join(columns)}")
+    return name, columns[name], sort.startswith("-")
+
+
+async def paginate(
+    session: AsyncSession,
+    query: Select,
+    columns: dict,
+    id_column,
+    limit: int,
+    after: str | None = None,
+    sort: str = "id",
+):
+    """Keyset-paginate `query` and return (rows, next_cursor).
+
+    Rows are ordered by the sort column with `id_column` as a tie breaker, so pages stay
+    stable while rows are inserted or deleted between calls.
+    """
+    name, column, descending = sort_column(columns, sort)
+    keys = [column] if column is id_column else [column, id_column]
+
+    if after:
+        value, row_id = decode_cursor(after, sort, _column_type(column))
+        if column is id_column:
+            lhs, rhs = column, row_id
+        else:
+            lhs, rhs = tuple_(*keys), tuple_(value, row_id)
+        query = query.where(lhs < rhs if descending else lhs > rhs)
+
+    query = query.order_by(*[key.desc() if descending else key.asc() for key in keys]).limit(limit + 1)
+    result = await session.execute(query)
+    descriptions = query.column_descriptions
+    selects_entity = len(descriptions) == 1 and descriptions[0]["expr"] is descriptions[0]["entity"]
+    rows = result.scalars().all() if selects_entity else result.all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_cursor(sort, getattr(last, name), getattr(last, id_column.key))
+    return rows, next_cursor
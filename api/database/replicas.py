@@ -0,0 +1,129 @@
+import asyncio
+import hashlib
+import logging
+import random
+
+from fastapi import Depends, Request
+from sqlalchemy import make_url, text
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from api import fastapi_config
+from api.database.database import get_session, make_engine
+from api.redis import redis_connection
+
+
+logger = logging.getLogger(__name__)
+
+# Zero while the replica has replayed everything it received, so an idle primary doesn't look like lag
+REPLICA_LAG_QUERY = text("""
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() OR pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+    END
+""")
+
+
+def _connection_lost(e: Exception) -> bool:
+    if isinstance(e, DBAPIError):
+        return e.connection_invalidated or isinstance(e.orig, OSError) or isinstance(e.__cause__, OSError)
+    return isinstance(e, OSError)
+
+
+class ReplicaSession(AsyncSession):
+    """A session on a replica that repeats on the primary a statement whose replica connection fails.
+
+    Reads are idempotent, so the request carries on instead of failing until the monitor notices.
+    """
+
+    replica: "Replica | None" = None
+    primary: AsyncSession | None = None
+    failed = False
+
+    async def _run(self, method: str, *args, **kwargs):
+        if self.failed:
+            return await getattr(self.primary, method)(*args, **kwargs)
+        try:
+            return await getattr(super(), method)(*args, **kwargs)
+        except (DBAPIError, OSError) as e:
+            if self.primary is None or not _connection_lost(e):
+                raise
+            logger.warning("Replica %s failed mid-request, reading from the primary: %s", self.bind.url, e)
+            # Send further reads to the primary until the monitor sees the replica recover
+            self.replica.healthy = False
+            self.failed = True
+            return await getattr(self.primary, method)(*args, **kwargs)
+
+    async def execute(self, *args, **kwargs):
+        return await self._run("execute", *args, **kwargs)
+
+    async def scalar(self, *args, **kwargs):
+        return await self._run("scalar", *args, **kwargs)
+
+    async def get(self, *args, **kwargs):
+        return await self._run("get", *args, **kwargs)
+
+    async def stream(self, *args, **kwargs):
+        return await self._run("stream", *args, **kwargs)
+
+
+class Replica:
+    def __init__(self, url: str):
+        address = make_url(url)
+        self.engine = make_engine(url, f"replica-{address.host}:{address.port or 5432}")
+        self.sessionmaker = async_sessionmaker(self.engine, class_=ReplicaSession, expire_on_commit=False)
+        # Unhealthy until the first check succeeds
+        self.healthy = False
+
+    async def check(self):
+        try:
+            async with self.engine.connect() as connection:
+                lag = (await connection.execute(REPLICA_LAG_QUERY)).scalar_one()
+            healthy = lag <= fastapi_config.REPLICA_MAX_LAG_SECONDS
+            if not healthy:
+                logger.warning("Replica %s lags %.1fs behind, reading from the primary", self.engine.url, lag)
+        except (DBAPIError, OSError) as e:
+            logger.warning("Replica %s is unreachable, reading from the primary: %s", self.engine.url, e)
+            healthy = False
+        self.healthy = healthy
+
+
+replicas = [Replica(url) for url in fastapi_config.SQLALCHEMY_REPLICA_URIS]
+
+
+async def monitor_replicas():
+    """Keep the health of every replica up to date; reads only go to replicas that are up and caught up."""
+    while True:
+        await asyncio.gather(*[replica.check() for replica in replicas])
+        await asyncio.sleep(fastapi_config.REPLICA_CHECK_INTERVAL)
+
+
+def _write_key(request: Request) -> str:
+    # The bearer token (or the address of anonymous callers) identifies whose writes reads must see
+    caller = request.headers.get("authorization") or (request.client.host if request.client else "")
+    return f"rw:{hashlib.sha1(caller.encode()).hexdigest()}"
+
+
+async def mark_write(request: Request):
+    """Route the caller's reads to the primary until the replicas have caught up with their write."""
+    if replicas:
+        await redis_connection.set(_write_key(request), 1, ex=fastapi_config.READ_YOUR_WRITES_SECONDS)
+
+
+async def get_read_session(request: Request, session: AsyncSession = Depends(get_session)) -> AsyncSession:
+    """A session on a healthy replica, or on the primary after the caller's own write or when none is healthy."""
+    healthy = [replica for replica in replicas if replica.healthy]
+    if not healthy or await redis_connection.exists(_write_key(request)):
+        yield session
+        return
+
+    replica = random.choice(healthy)
+    async with replica.sessionmaker() as replica_session:
+        replica_session.replica = replica
+        replica_session.primary = session
+        try:
+            yield replica_session
+        except (DBAPIError, OSError) as e:
+            if _connection_lost(e):
+                replica.healthy = False
+            raise
@@ -7,17 +7,19 @@ from sqlalchemy.ext.asyncio import AsyncSession
 
 from api import fastapi_config
 from api.database.database import get_session
-from api.models.user import UserModel
+from api.models.user import UserModel, user_cache_key
+from api.redis import local_cache
 from api.rest.schemas import auth
+from api.rest.schemas.user import User
 
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/login")
 
+USER_CACHE_TTL = 60
 
-async def get_current_user(
-    token: Annotated[str, Depends(oauth2_scheme)],
-    session: AsyncSession = Depends(get_session),
-):
+
+async def get_token_data(token: Annotated[str, Depends(oauth2_scheme)]) -> auth.TokenData:
+    """Identify the caller from the signed access token alone, without touching the database."""
     credentials_exception = HTTPException(
         status_code=401,
         detail="Could not validate credentials",
@@ -28,10 +30,30 @@ async def get_current_user(
         login: str = payload.get("sub")
         if login is None:
             raise credentials_exception
-        token_data = auth.TokenData(login=login)
+        return auth.TokenData(login=login, groups=payload.get("groups", []))
     except JWTError:
         raise credentials_exception
-    user = await UserModel.get_by_login(session, login=token_data.login)
+
+
+async def get_current_user(
+    token_data: auth.TokenData = Depends(get_token_data),
+    session: AsyncSession = Depends(get_session),
+) -> User:
+    """The full user record, for endpoints that need more than the token claims.
+
+    Records are cached per worker for a short TTL and dropped on every worker when the user is saved.
+    """
+    key = user_cache_key(token_data.login)
+    user = local_cache.get(key)
     if user is None:
-        raise credentials_exception
+        db_user = await UserModel.get_by_login(session, login=token_data.login)
+        if db_user is None:
+            raise HTTPException(
+                status_code=401,
+                detail="Could not validate credentials",
+                headers={"WWW-Authenticate": "Bearer"},
+            )
+        # A plain snapshot, so the cached record is never bound to (or modified through) a request's session
+        user = User.model_validate(db_user.to_dict())
+        local_cache.set(key, user, len(user.model_dump_json()), USER_CACHE_TTL)
     return user
@@ -0,0 +1,42 @@
+from graphql import GraphQLError
+import strawberry
+
+from api import fastapi_config
+from api.database.pagination import PaginationError, encode_cursor
+from api.graphql.schemas.connection import Connection, Edge, PageInfo
+from api.graphql.selection import load_options, selected_fields
+
+
+def _node_selections(selections: list) -> list:
+    edges = selected_fields(selections).get("edges")
+    node = selected_fields(edges.selections).get("node") if edges else None
+    return node.selections if node else []
+
+
+async def resolve_connection(
+    info: strawberry.types.Info, model, first: int, after: str | None, sort: str, **filters
+) -> Connection:
+    """Serve a keyset page of `model` as a connection; `filters` are passed to the model's SQL filters."""
+    if not 1 <= first <= fastapi_config.PAGE_SIZE_MAX:
+        raise GraphQLError(f"`first` must be between 1 and {fastapi_config.PAGE_SIZE_MAX}")
+    session = info.context["read_session"]
+    selections = info.selected_fields[0].selections
+    # The sort column is needed for the edge cursors even when the query doesn't select it
+    sort_name = sort.lstrip("-")
+    required = (sort_name,) if sort_name in model.sort_keys else ()
+    try:
+        rows, next_cursor = await model.get_page(
+            session, first, after, sort,
+            options=load_options(model, _node_selections(selections), required=required),
+            **filters,
+        )
+    except PaginationError as e:
+        raise GraphQLError(str(e)) from e
+
+    edges = [Edge(cursor=encode_cursor(sort, getattr(row, sort_name), row.id), node=row) for row in rows]
+    total_count = await model.count(session, **filters) if "total_count" in selected_fields(selections) else None
+    return Connection(
+        edges=edges,
+        page_info=PageInfo(has_next_page=next_cursor is not None, end_cursor=edges[-1].cursor if edges else None),
+        total_count=total_count,
+    )
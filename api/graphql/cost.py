@@ -0,0 +1,154 @@
+import logging
+import time
+
+from graphql import (
+    ExecutionResult,
+    FieldNode,
+    FragmentSpreadNode,
+    GraphQLError,
+    InlineFragmentNode,
+    get_named_type,
+    get_nullable_type,
+    is_list_type,
+)
+from graphql.execution.values import get_argument_values
+from graphql.utilities import get_operation_ast
+from strawberry.extensions import SchemaExtension
+
+from api import fastapi_config
+from api.metrics import GRAPHQL_QUERY_COST, GRAPHQL_QUERY_DEPTH, GRAPHQL_REJECTED
+from api.redis import redis_connection
+
+
+logger = logging.getLogger(__name__)
+
+
+# Fields that cost more than resolving an attribute: each one is a query, a batched loader call or a count.
+# Every other object field weighs 1 and scalars are free.
+FIELD_WEIGHTS = {
+    "Query.books": 5,
+    "Query.authors": 5,
+    "Query.users": 5,
+    "Book.authors": 2,
+    "Author.books": 2,
+    "BookConnection.totalCount": 5,
+    "AuthorConnection.totalCount": 5,
+    "UserConnection.totalCount": 5,
+}
+
+
+class QueryCost:
+    """Static cost and depth of one operation.
+
+    A field costs its weight plus the cost of its selection, multiplied by the expected number of items
+    for list fields: the `first` argument of the enclosing connection, or GRAPHQL_LIST_SIZE_ESTIMATE
+    for lists that aren't paginated.
+    """
+
+    def __init__(self, schema, document, operation_name: str | None, variables: dict | None):
+        self.schema = schema
+        self.variables = variables or {}
+        self.fragments = {
+            definition.name.value: definition for definition in document.definitions
+            if definition.kind == "fragment_definition"
+        }
+        self.operation = get_operation_ast(document, operation_name)
+
+    def compute(self) -> tuple[int, int]:
+        if self.operation is None:
+            return 0, 0
+        root = self.schema.get_root_type(self.operation.operation)
+        return self._selection_cost(root, self.operation.selection_set, fastapi_config.GRAPHQL_LIST_SIZE_ESTIMATE)
+
+    def _fields(self, parent_type, selection_set):
+        for selection in selection_set.selections:
+            if isinstance(selection, FieldNode):
+                yield parent_type, selection
+            elif isinstance(selection, FragmentSpreadNode):
+                fragment = self.fragments.get(selection.name.value)
+                if fragment:
+                    yield from self._fields(self.schema.get_type(fragment.type_condition.name.value),
+                                            fragment.selection_set)
+            elif isinstance(selection, InlineFragmentNode):
+                condition = selection.type_condition
+                yield from self._fields(
+                    self.schema.get_type(condition.name.value) if condition else parent_type, selection.selection_set
+                )
+
+    def _selection_cost(self, parent_type, selection_set, list_size: int) -> tuple[int, int]:
+        cost, depth = 0, 0
+        for field_type, node in self._fields(parent_type, selection_set):
+            name = node.name.value
+            field = field_type.fields.get(name) if hasattr(field_type, "fields") else None
+            if field is None or name.startswith("__"):
+                continue
+            named_type = get_named_type(field.type)
+            if node.selection_set is None:
+                cost += FIELD_WEIGHTS.get(f"{field_type.name}.{name}", 0)
+                depth = max(depth, 1)
+                continue
+
+            child_list_size = fastapi_config.GRAPHQL_LIST_SIZE_ESTIMATE
+            if "first" in field.args:
+                try:
+                    child_list_size = get_argument_values(field, node, self.variables)["first"]
+                except (GraphQLError, KeyError, TypeError):
+                    pass
+            multiplier = list_size if is_list_type(get_nullable_type(field.type)) else 1
+            child_cost, child_depth = self._selection_cost(named_type, node.selection_set, child_list_size)
+            cost += FIELD_WEIGHTS.get(f"{field_type.name}.{name}", 1) + multiplier * child_cost
+            depth = max(depth, child_depth + 1)
+        return cost, depth
+
+
+class QueryCostLimiter(SchemaExtension):
+    """Reject operations that are too deep or too expensive, and throttle clients that spend their budget.
+
+    The cost is computed from the document before anything runs; every client (by address) may spend
+    GRAPHQL_COST_BUDGET points per minute.
+    """
+
+    async def on_execute(self):
+        error = await self._check()
+        if error:
+            # A result set before execution short-circuits it
+            self.execution_context.result = ExecutionResult(data=None, errors=[error])
+        yield
+
+    async def _check(self) -> GraphQLError | None:
+        context = self.execution_context
+        cost, depth = QueryCost(
+            context.schema._schema, context.graphql_document, context.operation_name, context.variables
+        ).compute()
+        # Operation names are chosen by the client, so they go to the logs rather than into metric labels
+        logger.debug("GraphQL operation %s: cost %d, depth %d", context.operation_name or "anonymous", cost, depth)
+        GRAPHQL_QUERY_COST.observe(cost)
+        GRAPHQL_QUERY_DEPTH.observe(depth)
+
+        if depth > fastapi_config.GRAPHQL_MAX_DEPTH:
+            return self._reject(
+                "depth", f"Query depth {depth} exceeds the maximum of {fastapi_config.GRAPHQL_MAX_DEPTH}"
+            )
+        if cost > fastapi_config.GRAPHQL_MAX_COST:
+            return self._reject("cost", f"Query cost {cost} exceeds the maximum of {fastapi_config.GRAPHQL_MAX_COST}")
+        if not await self._within_budget(cost):
+            return self._reject("throttled", "Query cost budget exhausted, retry in a minute")
+        return None
+
+    def _reject(self, reason: str, message: str) -> GraphQLError:
+        GRAPHQL_REJECTED.labels(reason).inc()
+        logger.info("Rejected GraphQL operation %s: %s", self.execution_context.operation_name or "anonymous", message)
+        code = "THROTTLED" if reason == "throttled" else "QUERY_TOO_EXPENSIVE"
+        return GraphQLError(message, extensions={"code": code})
+
+    async def _within_budget(self, cost: int) -> bool:
+        if not fastapi_config.GRAPHQL_COST_BUDGET or not cost:
+            return True
+        request = (self.execution_context.context or {}).get("request")
+        client = request.client.host if request is not None and request.client else "unknown"
+        key = f"graphql:budget:{client}:{int(time.time() // 60)}"
+        async with redis_connection.pipeline(transaction=True) as pipe:
+            pipe.incrby(key, cost)
+            pipe.expire(key, 60)
+            spent, _ = await pipe.execute()
+        return spent <= fastapi_config.GRAPHQL_COST_BUDGET
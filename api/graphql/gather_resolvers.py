@@ -1,9 +1,14 @@
 import strawberry
+from strawberry.extensions import ParserCache, ValidationCache
 
+from api import fastapi_config
+from api.graphql.cost import QueryCostLimiter
+from api.graphql.read_your_writes import ReadYourWrites
 from api.graphql.resolvers.auth import AuthMutation
 from api.graphql.resolvers.authors import AuthorQuery
 from api.graphql.resolvers.books import BookQuery
 from api.graphql.resolvers.users import UserQuery
+from api.graphql.result_cache import GraphQLResultCache, cached
 
 
 @strawberry.type
@@ -16,4 +21,16 @@ class Query(UserQuery, AuthorQuery, BookQuery):
     pass
 
 
-schema = strawberry.Schema(query=Query, mutation=Mutation)
+schema = strawberry.Schema(
+    query=Query,
+    mutation=Mutation,
+    # Repeated operations (persisted queries in particular) skip parsing and validation
+    extensions=[
+        ParserCache(maxsize=fastapi_config.GRAPHQL_DOCUMENT_CACHE_SIZE),
+        ValidationCache(maxsize=fastapi_config.GRAPHQL_DOCUMENT_CACHE_SIZE),
+        QueryCostLimiter,
+        GraphQLResultCache,
+        ReadYourWrites,
+    ],
+    directives=[cached],
+)
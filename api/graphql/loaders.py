@@ -0,0 +1,14 @@
+from functools import partial
+
+from sqlalchemy.ext.asyncio import AsyncSession
+from strawberry.dataloader import DataLoader
+
+from api.models import AuthorModel, BookModel
+
+
+def create_loaders(session: AsyncSession) -> dict:
+    """Per-request loaders that batch relationship lookups of sibling objects into one query each."""
+    return {
+        "authors_by_book": DataLoader(load_fn=partial(AuthorModel.get_by_book_ids, session)),
+        "books_by_author": DataLoader(load_fn=partial(BookModel.get_by_author_ids, session)),
+    }
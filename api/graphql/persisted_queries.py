@@ -0,0 +1,80 @@
+import hashlib
+import json
+
+from graphql import GraphQLError
+from strawberry.fastapi import GraphQLRouter
+from strawberry.http.exceptions import HTTPException
+from strawberry.types import ExecutionResult
+
+from api import fastapi_config
+from api.redis import local_cache, redis_connection
+
+
+class PersistedQueryNotFound(Exception):
+    pass
+
+
+def _query_key(sha256_hash: str) -> str:
+    return f"apq:{sha256_hash}"
+
+
+async def get_persisted_query(sha256_hash: str) -> str | None:
+    key = _query_key(sha256_hash)
+    query = local_cache.get(key)
+    if query is None:
+        # Sliding expiry, so documents that clients keep sending never fall out
+        query = await redis_connection.getex(key, ex=fastapi_config.PERSISTED_QUERY_TTL)
+        if query is None:
+            return None
+        query = query.decode()
+        # A hash always names the same document, so the local copy never needs invalidating
+        local_cache.set(key, query, len(query), fastapi_config.PERSISTED_QUERY_TTL)
+    return query
+
+
+async def persist_query(sha256_hash: str, query: str):
+    if hashlib.sha256(query.encode()).hexdigest() != sha256_hash:
+        raise HTTPException(400, "provided sha does not match query")
+    await redis_connection.set(_query_key(sha256_hash), query, ex=fastapi_config.PERSISTED_QUERY_TTL)
+    local_cache.set(_query_key(sha256_hash), query, len(query), fastapi_config.PERSISTED_QUERY_TTL)
+
+
+class PersistedQueryRouter(GraphQLRouter):
+    """GraphQL router speaking the automatic persisted queries protocol.
+
+    A client first sends only `extensions.persistedQuery.sha256Hash`. If the hash is unknown it gets a
+    `PersistedQueryNotFound` error and retries with the full query, which is stored under that hash.
+    """
+
+    async def _request_extensions(self, request) -> dict:
+        if request.method == "GET":
+            extensions = request.query_params.get("extensions")
+            return self.parse_json(extensions) if extensions else {}
+        if "application/json" in (request.content_type or ""):
+            return self.parse_json(await request.get_body()).get("extensions") or {}
+        return {}
+
+    async def parse_http_body(self, request):
+        request_data = await super().parse_http_body(request)
+        persisted_query = (await self._request_extensions(request)).get("persistedQuery")
+        if not persisted_query:
+            return request_data
+        if persisted_query.get("version") != 1 or not isinstance(persisted_query.get("sha256Hash"), str):
+            raise HTTPException(400, "Unsupported persisted query")
+
+        sha256_hash = persisted_query["sha256Hash"]
+        if request_data.query:
+            await persist_query(sha256_hash, request_data.query)
+            return request_data
+        request_data.query = await get_persisted_query(sha256_hash)
+        if request_data.query is None:
+            raise PersistedQueryNotFound()
+        return request_data
+
+    async def execute_operation(self, request, context, root_value):
+        try:
+            return await super().execute_operation(request, context, root_value)
+        except PersistedQueryNotFound:
+            return ExecutionResult(data=None, errors=[
+                GraphQLError("PersistedQueryNotFound", extensions={"code": "PERSISTED_QUERY_NOT_FOUND"})
+            ])
@@ -0,0 +1,17 @@
+from strawberry.extensions import SchemaExtension
+from strawberry.types.graphql import OperationType
+
+from api.database.replicas import mark_write
+
+
+class ReadYourWrites(SchemaExtension):
+    """Send the caller's reads to the primary for a while after a successful mutation."""
+
+    async def on_execute(self):
+        yield
+        context = self.execution_context
+        request = (context.context or {}).get("request")
+        if context.operation_type == OperationType.MUTATION and request is not None:
+            result = context.result
+            if result is not None and not result.errors:
+                await mark_write(request)
@@ -3,8 +3,9 @@ import strawberry
 
 from api.graphql.schemas.auth import Token
 from api.graphql.schemas.users import User
+from api.hashing import HashingQueueFull
 from api.models.user import UserModel
-from api.security import create_access_token, create_refresh_token
+from api.security import RefreshTokenError, create_access_token, create_refresh_token, rotate_refresh_token
 from api.tasks.tasks import send_welcome_email
 
 
@@ -18,25 +19,22 @@ class AuthMutation:
             if existing_user:
                 raise GraphQLError("User already exists. Please Log in")
 
-            new_user = UserModel(
-                name=name,
-                login=login,
-                hashed_password=UserModel.generate_hash(password),
-                email=email,
-            )
-            await new_user.save_to_db(session)
+            hashed_password = await UserModel.generate_hash_async(password)
+            new_user = await UserModel.create(session, name, login, hashed_password, email)
 
             if email:
                 try:
                     send_welcome_email.delay(email_to=email, body={"name": name})
                 except Exception as e:
-                    await UserModel.delete_by_id(session, new_user.id)
+                    await UserModel.delete_by_id(session, new_user["id"])
                     raise GraphQLError("Failed to send welcome email. User registration rolled back.") from e
 
-            return User(**new_user.to_dict())
+            return User(**new_user)
 
         except GraphQLError:
             raise
+        except HashingQueueFull as e:
+            raise GraphQLError(str(e)) from e
         except Exception as e:
             raise GraphQLError("Failed to create user. Database access error.") from e
 
@@ -50,9 +48,22 @@ class AuthMutation:
         if not user:
             raise GraphQLError("Authentification failed! Check entered values")
 
-        if UserModel.verify_hash(password, user.hashed_password):
+        try:
+            password_matches = await UserModel.verify_hash_async(password, user.hashed_password)
+        except HashingQueueFull as e:
+            raise GraphQLError(str(e)) from e
+
+        if password_matches:
             return Token(
                 access_token=create_access_token(subject=user.login, user=user),
-                refresh_token=create_refresh_token(subject=user.login, user=user),
+                refresh_token=await create_refresh_token(subject=user.login, user=user),
             )
         raise GraphQLError("You've entered wrong password")
+
+    @strawberry.mutation
+    async def refresh(self, refresh_token: str) -> Token:
+        try:
+            tokens = await rotate_refresh_token(refresh_token)
+        except RefreshTokenError as e:
+            raise GraphQLError(str(e)) from e
+        return Token(**tokens)
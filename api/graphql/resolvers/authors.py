@@ -1,20 +1,26 @@
-from typing import List
+from typing import Optional
 import strawberry
 
+from api import fastapi_config
+from api.graphql.connection import resolve_connection
 from api.graphql.schemas.authors import Author
+from api.graphql.schemas.connection import Connection
 from api.models.author import AuthorModel
 
 
 @strawberry.type
 class AuthorQuery:
     @strawberry.field
-    async def authors(self, info: strawberry.types.Info) -> List[Author]:
-        session = info.context["session"]
-        authors = await AuthorModel.return_all(session)
-        return [
-            Author(
-                id=author.id,
-                name=author.name,
-            )
-            for author in authors
-        ]
+    async def authors(
+        self,
+        info: strawberry.types.Info,
+        first: int = fastapi_config.PAGE_SIZE_DEFAULT,
+        after: Optional[str] = None,
+        sort: str = "id",
+        name_contains: Optional[str] = None,
+        book_id: Optional[int] = None,
+        is_active: Optional[bool] = True,
+    ) -> Connection[Author]:
+        return await resolve_connection(
+            info, AuthorModel, first, after, sort, name_contains=name_contains, book_id=book_id, is_active=is_active
+        )
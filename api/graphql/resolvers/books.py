@@ -1,22 +1,27 @@
-from typing import List
+from typing import Optional
 import strawberry
 
+from api import fastapi_config
+from api.graphql.connection import resolve_connection
 from api.graphql.schemas.books import Book
+from api.graphql.schemas.connection import Connection
 from api.models.book import BookModel
 
 
 @strawberry.type
 class BookQuery:
     @strawberry.field
-    async def books(self, info: strawberry.types.Info) -> List[Book]:
-        session = info.context["session"]
-        books = await BookModel.return_all(session)
-        return [
-            Book(
-                id=book.id,
-                title=book.title,
-                description=book.description,
-                authors=book.authors,
-            )
-            for book in books
-        ]
+    async def books(
+        self,
+        info: strawberry.types.Info,
+        first: int = fastapi_config.PAGE_SIZE_DEFAULT,
+        after: Optional[str] = None,
+        sort: str = "id",
+        title_contains: Optional[str] = None,
+        author_id: Optional[int] = None,
+        is_active: Optional[bool] = True,
+    ) -> Connection[Book]:
+        # Rows are loaded with only the requested columns and served as-is, so the types never touch the rest
+        return await resolve_connection(
+            info, BookModel, first, after, sort, title=title_contains, author_id=author_id, is_active=is_active
+        )
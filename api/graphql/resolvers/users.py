@@ -1,6 +1,9 @@
-from typing import List
+from typing import Optional
 import strawberry
 
+from api import fastapi_config
+from api.graphql.connection import resolve_connection
+from api.graphql.schemas.connection import Connection
 from api.graphql.schemas.users import User
 from api.models.user import UserModel
 
@@ -8,7 +11,15 @@ from api.models.user import UserModel
 @strawberry.type
 class UserQuery:
     @strawberry.field
-    async def users(self, info: strawberry.types.Info) -> List[User]:
-        session = info.context["session"]
-        users = await UserModel.return_all(session)
-        return [User(**user.to_dict()) for user in users]
+    async def users(
+        self,
+        info: strawberry.types.Info,
+        first: int = fastapi_config.PAGE_SIZE_DEFAULT,
+        after: Optional[str] = None,
+        sort: str = "id",
+        login_contains: Optional[str] = None,
+        is_active: Optional[bool] = True,
+    ) -> Connection[User]:
+        return await resolve_connection(
+            info, UserModel, first, after, sort, login_contains=login_contains, is_active=is_active
+        )
@@ -0,0 +1,108 @@
+import hashlib
+import json
+
+from fastapi import HTTPException
+from graphql import (
+    ExecutionResult, TypeInfo, TypeInfoVisitor, Visitor, get_named_type, is_object_type, print_ast, visit
+)
+from graphql.execution.values import get_directive_values
+from graphql.utilities import get_operation_ast
+from strawberry.directive import DirectiveLocation
+from strawberry.extensions import SchemaExtension
+from strawberry.types.graphql import OperationType
+import strawberry
+
+from api import fastapi_config
+from api.dependencies import get_token_data
+from api.redis import get_tagged, graphql_type_tag, set_tagged
+
+
+@strawberry.directive(
+    locations=[DirectiveLocation.QUERY],
+    description="Serve the query from the result cache for up to `ttl` seconds",
+)
+def cached(ttl: int = fastapi_config.GRAPHQL_RESULT_CACHE_TTL):
+    # Read by GraphQLResultCache; there is nothing to resolve
+    pass
+
+
+class _TypeCollector(Visitor):
+    def __init__(self, type_info: TypeInfo):
+        super().__init__()
+        self.type_info = type_info
+        self.types = set()
+
+    def enter_field(self, *_):
+        named_type = get_named_type(self.type_info.get_type())
+        if not is_object_type(named_type) or named_type.name.startswith("__"):
+            return
+        self.types.add(named_type.name)
+        # A connection depends on its node type even when only `totalCount` or `pageInfo` are selected
+        if "edges" in named_type.fields:
+            edge = get_named_type(named_type.fields["edges"].type)
+            self.types.add(get_named_type(edge.fields["node"].type).name)
+
+
+def result_types(schema, document) -> set[str]:
+    """Names of the object types whose data can appear in the result of `document`."""
+    type_info = TypeInfo(schema)
+    collector = _TypeCollector(type_info)
+    visit(document, TypeInfoVisitor(type_info, collector))
+    return collector.types
+
+
+async def _scope(request) -> str:
+    authorization = request.headers.get("authorization", "") if request is not None else ""
+    scheme, _, token = authorization.partition(" ")
+    if scheme.lower() != "bearer" or not token:
+        return "anonymous"
+    try:
+        token_data = await get_token_data(token)
+    except HTTPException:
+        return "anonymous"
+    return "admin" if token_data.is_admin else "user"
+
+
+class GraphQLResultCache(SchemaExtension):
+    """Cache the results of queries marked with `@cached` in Redis.
+
+    Entries are keyed by the normalized document, operation name, variables and the caller's scope, and are
+    tagged with every object type in the selection; the models invalidate those tags when they save.
+    """
+
+    async def on_execute(self):
+        context = self.execution_context
+        ttl = self._ttl()
+        if ttl is None or context.result is not None:
+            yield
+            return
+
+        params = json.dumps(
+            [print_ast(context.graphql_document), context.operation_name, context.variables or {}],
+            sort_keys=True,
+        )
+        scope = await _scope((context.context or {}).get("request"))
+        key = f"cache:graphql:{scope}:{hashlib.sha256(params.encode()).hexdigest()}"
+        data = await get_tagged(key)
+        if data is not None:
+            context.result = ExecutionResult(data=data)
+            yield
+            return
+
+        yield
+        result = context.result
+        if result is not None and not result.errors and result.data is not None:
+            tags = [graphql_type_tag(name) for name in result_types(context.schema._schema, context.graphql_document)]
+            await set_tagged(key, result.data, ttl, tags, tags_ttl=fastapi_config.GRAPHQL_RESULT_CACHE_MAX_TTL)
+
+    def _ttl(self) -> int | None:
+        """Seconds to cache the operation for, or None unless it is a query marked with `@cached`."""
+        context = self.execution_context
+        if context.operation_type != OperationType.QUERY:
+            return None
+        operation = get_operation_ast(context.graphql_document, context.operation_name)
+        schema = context.schema._schema
+        values = get_directive_values(schema.get_directive("cached"), operation, context.variables)
+        if values is None:
+            return None
+        return min(values["ttl"], fastapi_config.GRAPHQL_RESULT_CACHE_MAX_TTL) if values["ttl"] > 0 else None
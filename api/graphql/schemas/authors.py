@@ -1,7 +1,22 @@
+from typing import TYPE_CHECKING, Annotated, List
 import strawberry
 
+from api.graphql.selection import is_loaded
+
+if TYPE_CHECKING:
+    from api.graphql.schemas.books import Book
+
 
 @strawberry.type
 class Author:
     id: int
     name: str
+
+    @strawberry.field
+    async def books(
+        self, info: strawberry.types.Info
+    ) -> List[Annotated["Book", strawberry.lazy("api.graphql.schemas.books")]]:
+        # `self` is the AuthorModel row served by the resolver; use its books if they were eager-loaded
+        if is_loaded(self, "books"):
+            return self.books
+        return await info.context["books_by_author"].load(self.id)
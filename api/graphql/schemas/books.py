@@ -2,6 +2,7 @@ from typing import List
 import strawberry
 
 from api.graphql.schemas.authors import Author
+from api.graphql.selection import is_loaded
 
 
 @strawberry.type
@@ -9,4 +10,10 @@ class Book:
     id: int
     title: str
     description: str
-    authors: List[Author]
+
+    @strawberry.field
+    async def authors(self, info: strawberry.types.Info) -> List[Author]:
+        # `self` is the BookModel row served by the resolver; use its authors if they were eager-loaded
+        if is_loaded(self, "authors"):
+            return self.authors
+        return await info.context["authors_by_book"].load(self.id)
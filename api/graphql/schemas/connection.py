@@ -0,0 +1,24 @@
+from typing import Generic, List, Optional, TypeVar
+import strawberry
+
+T = TypeVar("T")
+
+
+@strawberry.type
+class PageInfo:
+    has_next_page: bool
+    end_cursor: Optional[str]
+
+
+@strawberry.type
+class Edge(Generic[T]):
+    cursor: str
+    node: T
+
+
+@strawberry.type
+class Connection(Generic[T]):
+    edges: List[Edge[T]]
+    page_info: PageInfo
+    # Only counted when the query selects it
+    total_count: Optional[int]
@@ -0,0 +1,44 @@
+from sqlalchemy import inspect
+from sqlalchemy.orm import load_only, selectinload
+from strawberry.types.nodes import FragmentSpread, InlineFragment
+from strawberry.utils.str_converters import to_snake_case
+
+
+def selected_fields(selections: list) -> dict:
+    """Map the snake_case name of every field in `selections` to its selection, flattening fragments."""
+    fields = {}
+    for selection in selections:
+        if isinstance(selection, (FragmentSpread, InlineFragment)):
+            fields.update(selected_fields(selection.selections))
+        else:
+            fields[to_snake_case(selection.name)] = selection
+    return fields
+
+
+def load_options(model, selections: list, required: tuple = ()) -> list:
+    """Loader options that fetch only the selected columns of `model`, plus the `required` ones.
+
+    Selected relationships are eager-loaded one level deep, again limited to their selected columns;
+    anything nested deeper is left to the request's DataLoaders.
+    """
+    return _load_options(model, selections, depth=1, required=required)
+
+
+def _load_options(model, selections: list, depth: int, required: tuple = ()) -> list:
+    mapper = inspect(model)
+    fields = selected_fields(selections)
+    names = dict.fromkeys([*required, *fields])
+    columns = [getattr(model, name) for name in names if name in mapper.column_attrs]
+    options = [load_only(*columns or [getattr(model, key.key) for key in mapper.primary_key])]
+    if depth:
+        for name, field in fields.items():
+            if name in mapper.relationships:
+                related = mapper.relationships[name].mapper.class_
+                options.append(
+                    selectinload(getattr(model, name)).options(*_load_options(related, field.selections, depth - 1))
+                )
+    return options
+
+
+def is_loaded(instance, attribute: str) -> bool:
+    return attribute not in inspect(instance).unloaded
@@ -0,0 +1,70 @@
+from concurrent.futures import ProcessPoolExecutor
+import asyncio
+import multiprocessing
+import time
+
+from passlib.hash import pbkdf2_sha256 as sha256
+
+from api import fastapi_config
+from api.metrics import HASHING_QUEUE_DEPTH, HASHING_WAIT_SECONDS, HASHING_REJECTED
+
+
+class HashingQueueFull(Exception):
+    pass
+
+
+_executor: ProcessPoolExecutor | None = None
+_pending = 0
+
+
+def _hash(password: str, submitted_at: float):
+    waited = time.time() - submitted_at
+    return sha256.hash(password), waited
+
+
+def _verify(password: str, password_hash: str, submitted_at: float):
+    waited = time.time() - submitted_at
+    return sha256.verify(password, password_hash), waited
+
+
+def _get_executor() -> ProcessPoolExecutor:
+    global _executor
+    if _executor is None:
+        # spawn rather than fork: the parent runs an event loop and threads that must not be copied into workers
+        _executor = ProcessPoolExecutor(
+            max_workers=fastapi_config.HASHING_WORKERS, mp_context=multiprocessing.get_context("spawn")
+        )
+    return _executor
+
+
+async def _run(func, *args):
+    """Run a hashing job in the pool; refuse it when HASHING_MAX_QUEUE jobs are already waiting or running."""
+    global _pending
+    if _pending >= fastapi_config.HASHING_MAX_QUEUE:
+        HASHING_REJECTED.inc()
+        raise HashingQueueFull("Too many password operations in progress, try again later")
+    _pending += 1
+    HASHING_QUEUE_DEPTH.set(_pending)
+    try:
+        loop = asyncio.get_running_loop()
+        result, waited = await loop.run_in_executor(_get_executor(), func, *args, time.time())
+        HASHING_WAIT_SECONDS.observe(waited)
+        return result
+    finally:
+        _pending -= 1
+        HASHING_QUEUE_DEPTH.set(_pending)
+
+
+async def hash_password(password: str) -> str:
+    return await _run(_hash, password)
+
+
+async def verify_password(password: str, password_hash: str) -> bool:
+    return await _run(_verify, password, password_hash)
+
+
+def shutdown():
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
@@ -1,36 +1,64 @@
 from contextlib import asynccontextmanager
+import asyncio
 
-from fastapi import FastAPI, Depends
-from strawberry.fastapi import GraphQLRouter
+from fastapi import FastAPI, Depends, Request
+from prometheus_client import make_asgi_app
 from sqlalchemy.ext.asyncio import AsyncSession
 import uvicorn
 
-from api.database.database import Base, engine, get_session
+from api import hashing
+from api.database.database import Base, engine, get_session, warm_pool
+from api.database.replicas import get_read_session, mark_write, monitor_replicas
 from api.graphql import schema
+from api.graphql.loaders import create_loaders
+from api.graphql.persisted_queries import PersistedQueryRouter
+from api.redis import listen_for_invalidations
 
 
 @asynccontextmanager
 async def lifespan(_: FastAPI):
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
+    await warm_pool(engine)
+    invalidation_listener = asyncio.create_task(listen_for_invalidations())
+    replica_monitor = asyncio.create_task(monitor_replicas())
     yield
+    invalidation_listener.cancel()
+    replica_monitor.cancel()
+    hashing.shutdown()
 
 
-async def get_graphql_context(session: AsyncSession = Depends(get_session)):
-    return {"session": session}
+async def get_graphql_context(
+    session: AsyncSession = Depends(get_session),
+    read_session: AsyncSession = Depends(get_read_session),
+):
+    # Mutations write through `session`; queries and their loaders read through `read_session`
+    return {"session": session, "read_session": read_session, **create_loaders(read_session)}
+
+
+async def read_your_writes(request: Request, call_next):
+    response = await call_next(request)
+    # GraphQL reads are POSTs too, so its mutations mark their own writes
+    if request.method not in ("GET", "HEAD", "OPTIONS") and not request.url.path.startswith("/graphql"):
+        if response.status_code < 400:
+            await mark_write(request)
+    return response
 
 
 def create_app():
     app = FastAPI(lifespan=lifespan)
+    app.middleware("http")(read_your_writes)
 
-    from api.rest.routers import users, auth, books, authors
+    from api.rest.routers import users, auth, books, authors, search
     app.include_router(users.router)
     app.include_router(auth.router)
     app.include_router(books.router)
     app.include_router(authors.router)
+    app.include_router(search.router)
 
-    graphql_app = GraphQLRouter(schema, context_getter=get_graphql_context)
+    graphql_app = PersistedQueryRouter(schema, context_getter=get_graphql_context)
     app.include_router(graphql_app, prefix="/graphql")
+    app.mount("/metrics", make_asgi_app())
 
     return app
 
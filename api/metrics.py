@@ -0,0 +1,32 @@
+from prometheus_client import Counter, Gauge, Histogram
+
+
+HASHING_QUEUE_DEPTH = Gauge(
+    "password_hashing_queue_depth", "Password hashing jobs submitted to the process pool and not finished yet"
+)
+HASHING_WAIT_SECONDS = Histogram(
+    "password_hashing_wait_seconds", "Time a password hashing job waited for a free pool worker"
+)
+HASHING_REJECTED = Counter(
+    "password_hashing_rejected", "Password hashing jobs rejected because the queue was full"
+)
+GRAPHQL_QUERY_COST = Histogram(
+    "graphql_query_cost", "Static cost of GraphQL operations",
+    buckets=(10, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 25000, 100000),
+)
+GRAPHQL_QUERY_DEPTH = Histogram(
+    "graphql_query_depth", "Selection depth of GraphQL operations", buckets=(1, 2, 3, 4, 5, 6, 8, 10, 15)
+)
+GRAPHQL_REJECTED = Counter(
+    "graphql_rejected", "GraphQL operations rejected before execution", ["reason"]
+)
+DB_POOL_CHECKED_OUT = Gauge(
+    "db_pool_checked_out_connections", "Database connections currently checked out of the pool", ["engine"]
+)
+DB_POOL_WAITING = Gauge(
+    "db_pool_waiting_checkouts", "Checkouts blocked until a connection is returned to the pool", ["engine"]
+)
+DB_POOL_CHECKOUT_SECONDS = Histogram(
+    "db_pool_checkout_seconds", "Time spent getting a connection from the pool", ["engine"],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30),
+)
@@ -1,8 +1,19 @@
-from sqlalchemy import Column, String, Integer, Boolean, select
-from sqlalchemy.orm import relationship, selectinload
+from itertools import chain
+
+from sqlalchemy import (
+    Column, String, Integer, Boolean, Computed, Index, text, select, insert, update, func, or_, cast
+)
+from sqlalchemy.dialects.postgresql import TSVECTOR, REGCONFIG
+from sqlalchemy.orm import relationship, selectinload, deferred
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from api import fastapi_config
 from api.database.database import Base
+from api.database.pagination import paginate
+from api.models.bulk import (
+    deactivate_rows, insert_links, insert_rows, linked_ids, related_rows, relink_rows, replace_links, update_rows
+)
+from api.redis import book_cache, author_cache, change_sequence, graphql_type_tag, invalidate_tags
 from api.models.book import book_author_association
 
 
@@ -13,14 +24,160 @@ class AuthorModel(Base):
     name = Column(String(255), nullable=False)
     books = relationship("BookModel", secondary=book_author_association, back_populates="authors")
     is_active = Column(Boolean, default=True)
+    search_vector = deferred(Column(TSVECTOR, Computed("to_tsvector('simple', coalesce(name, ''))", persisted=True)))
+
+    __table_args__ = (
+        Index("ix_authors_search_vector", "search_vector", postgresql_using="gin"),
+        Index("ix_authors_name_trgm", "name", postgresql_using="gin", postgresql_ops={"name": "gin_trgm_ops"}),
+        # Lookups by exact name and pages sorted by name; active rows only for pages by id
+        Index("ix_authors_name", "name", "id"),
+        Index("ix_authors_active_id", "id", postgresql_where=text("is_active")),
+    )
+
+    sort_keys = ("id", "name")
+    # Columns a client can pick with a sparse fieldset
+    field_names = ("id", "name")
 
     @classmethod
-    async def return_all(cls, session: AsyncSession):
+    async def return_all(cls, session: AsyncSession, options: list | None = None):
+        """All active rows; `options` replaces the default eager load of books."""
         result = await session.execute(
-            select(cls).where(cls.is_active == True).options(selectinload(cls.books))
+            select(cls).where(cls.is_active == True)
+            .options(*(options if options is not None else [selectinload(cls.books)]))
         )
         return result.scalars().all()
 
+    @classmethod
+    def _filter(
+        cls,
+        query,
+        name: str | None = None,
+        name_contains: str | None = None,
+        book_id: int | None = None,
+        is_active: bool | None = True,
+    ):
+        if is_active is not None:
+            query = query.where(cls.is_active == is_active)
+        if name:
+            query = query.where(cls.name == name)
+        if name_contains:
+            query = query.where(cls.name.ilike(f"%{name_contains}%"))
+        if book_id is not None:
+            query = query.where(cls.id.in_(
+                select(book_author_association.c.author_id).where(book_author_association.c.book_id == book_id)
+            ))
+        return query
+
+    @classmethod
+    async def get_page(
+        cls,
+        session: AsyncSession,
+        limit: int,
+        after: str | None = None,
+        sort: str = "id",
+        options: list | None = None,
+        **filters,
+    ):
+        """A keyset page of authors matching `filters` (see `_filter`); `options` replaces the default eager load."""
+        query = cls._filter(select(cls), **filters)
+        query = query.options(*(options if options is not None else [selectinload(cls.books)]))
+        columns = {key: getattr(cls, key) for key in cls.sort_keys}
+        return await paginate(session, query, columns, cls.id, limit, after, sort)
+
+    @classmethod
+    async def get_page_dicts(
+        cls, session: AsyncSession, limit: int, after: str | None = None, sort: str = "id", **filters
+    ):
+        """Like `get_page`, but only ids come from the database; the entities are read from the entity cache."""
+        columns = {key: getattr(cls, key) for key in cls.sort_keys}
+        query = cls._filter(select(*columns.values()), **filters)
+        rows, next_cursor = await paginate(session, query, columns, cls.id, limit, after, sort)
+        return await cls.get_dicts(session, [row.id for row in rows]), next_cursor
+
+    @classmethod
+    async def get_page_fields(
+        cls,
+        session: AsyncSession,
+        limit: int,
+        after: str | None = None,
+        sort: str = "id",
+        fields: list[str] = field_names,
+        with_books: bool = False,
+        **filters,
+    ):
+        """Like `get_page_dicts`, but only `fields` are selected and books are only loaded if `with_books`.
+
+        The entity cache holds whole authors, so it is bypassed.
+        """
+        columns = {key: getattr(cls, key) for key in cls.sort_keys}
+        selected = {**columns, **{field: getattr(cls, field) for field in fields}}
+        query = cls._filter(select(*selected.values()), **filters)
+        rows, next_cursor = await paginate(session, query, columns, cls.id, limit, after, sort)
+        return await cls._field_dicts(session, rows, fields, with_books), next_cursor
+
+    @classmethod
+    async def get_fields(
+        cls, session: AsyncSession, author_id: int, fields: list[str] = field_names, with_books: bool = False
+    ):
+        """`fields` of an active author, with its books if `with_books`; None if it doesn't exist."""
+        result = await session.execute(
+            select(*[getattr(cls, field) for field in fields]).where(cls.id == author_id, cls.is_active == True)
+        )
+        authors = await cls._field_dicts(session, result.all(), fields, with_books)
+        return authors[0] if authors else None
+
+    @classmethod
+    async def _field_dicts(cls, session: AsyncSession, rows, fields: list[str], with_books: bool):
+        """`fields` of `rows` as dicts, with the first RELATED_ITEMS_MAX books and their count if `with_books`."""
+        authors = [{field: row._mapping[field] for field in fields} for row in rows]
+        if with_books and authors:
+            author_ids = [author["id"] for author in authors]
+            books, counts = await related_rows(
+                session, *cls._link_columns(), author_ids, ["id", "title"], fastapi_config.RELATED_ITEMS_MAX
+            )
+            for author in authors:
+                author["books"] = books[author["id"]]
+                author["books_count"] = counts[author["id"]]
+        return authors
+
+    @classmethod
+    async def count(cls, session: AsyncSession, **filters):
+        result = await session.execute(cls._filter(select(func.count(cls.id)), **filters))
+        return result.scalar_one()
+
+    @classmethod
+    async def stream_dicts(cls, session: AsyncSession, batch_size: int, **filters):
+        """Every author matching `filters` as a dict, read through a server-side cursor `batch_size` rows at a time."""
+        result = await session.stream_scalars(
+            cls._filter(select(cls), **filters).order_by(cls.id)
+            .options(selectinload(cls.books))
+            .execution_options(yield_per=batch_size)
+        )
+        async for author in result:
+            yield author.to_dict()
+
+    @classmethod
+    async def get_dicts(cls, session: AsyncSession, author_ids: list[int]):
+        authors = await author_cache.get_many(author_ids)
+        missing = [author_id for author_id in author_ids if author_id not in authors]
+        if missing:
+            since = await change_sequence()
+            result = await session.execute(
+                select(*[getattr(cls, field) for field in cls.field_names])
+                .where(cls.id.in_(missing), cls.is_active == True)
+            )
+            loaded = {
+                author["id"]: author for author in await cls._field_dicts(session, result.all(), cls.field_names, True)
+            }
+            await author_cache.fill_many(loaded, since, session)
+            authors.update(loaded)
+        return [authors[author_id] for author_id in author_ids if author_id in authors]
+
+    @classmethod
+    async def get_dict(cls, session: AsyncSession, author_id: int):
+        authors = await cls.get_dicts(session, [author_id])
+        return authors[0] if authors else None
+
     @classmethod
     async def get_by_id(cls, session: AsyncSession, author_id: int):
         result = await session.execute(
@@ -36,6 +193,20 @@ class AuthorModel(Base):
         )
         return result.scalars().all()
 
+    @classmethod
+    async def get_by_book_ids(cls, session: AsyncSession, book_ids: list[int]):
+        """Authors of each book, in the order of `book_ids`, fetched in a single query."""
+        result = await session.execute(
+            select(book_author_association.c.book_id, cls)
+            .join(book_author_association, book_author_association.c.author_id == cls.id)
+            .where(book_author_association.c.book_id.in_(book_ids))
+            .order_by(cls.id)
+        )
+        authors = {book_id: [] for book_id in book_ids}
+        for book_id, author in result.all():
+            authors[book_id].append(author)
+        return [authors[book_id] for book_id in book_ids]
+
     @classmethod
     async def get_by_name(cls, session: AsyncSession, name: str):
         result = await session.execute(
@@ -45,18 +216,157 @@ class AuthorModel(Base):
         return result.scalars().all()
 
     @classmethod
-    async def delete_by_id(cls, session: AsyncSession, author_id: int):
-        author = await cls.get_by_id(session, author_id)
-        if author:
-            author.is_active = False
-            await author.save_to_db(session)
-            return 200
-        return 404
-
-    async def save_to_db(self, session: AsyncSession):
-        session.add(self)
+    async def search(cls, session: AsyncSession, text: str, limit: int):
+        """Rank active authors by full-text match or trigram similarity of the name."""
+        query = func.websearch_to_tsquery(cast("simple", REGCONFIG), text)
+        rank = func.greatest(func.ts_rank(cls.search_vector, query), func.similarity(cls.name, text)).label("rank")
+        result = await session.execute(
+            select(cls.id, rank)
+            .where(cls.is_active == True, or_(cls.search_vector.op("@@")(query), cls.name.op("%")(text)))
+            .order_by(rank.desc(), cls.id)
+            .limit(limit)
+        )
+        return result.all()
+
+    @classmethod
+    async def active_ids(cls, session: AsyncSession, author_ids: list[int]) -> set[int]:
+        result = await session.execute(select(cls.id).where(cls.id.in_(author_ids), cls.is_active == True))
+        return set(result.scalars())
+
+    @classmethod
+    async def ids_by_name(cls, session: AsyncSession, names: list[str]) -> dict[str, int]:
+        """Ids of the active authors with the given names, inserting the ones that don't exist yet (uncommitted)."""
+        result = await session.execute(
+            select(cls.name, func.min(cls.id)).where(cls.name.in_(names), cls.is_active == True).group_by(cls.name)
+        )
+        ids = dict(result.all())
+        missing = [name for name in names if name not in ids]
+        if missing:
+            ids.update(zip(missing, await insert_rows(session, cls.__table__, [{"name": name} for name in missing])))
+        return ids
+
+    @classmethod
+    async def create(cls, session: AsyncSession, name: str, book_ids: list[int] | None = None) -> dict:
+        """Insert an author linked to the active books among `book_ids` in one transaction; returns it as a dict."""
+        table = cls.__table__
+        columns = [table.c.id, table.c.name]
+        result = await session.execute(insert(table).values(name=name).returning(*columns))
+        row = result.one()
+        books = []
+        if book_ids:
+            _, _, books = await relink_rows(session, *cls._link_columns(), row.id, ["id", "title"], add=book_ids)
+        await session.commit()
+        author = {**row._mapping, "books": books[:fastapi_config.RELATED_ITEMS_MAX], "books_count": len(books)}
+        await cls._cache_write(author, [book["id"] for book in books], relinked=bool(books))
+        return author
+
+    @classmethod
+    async def update(
+        cls, session: AsyncSession, author_id: int, name: str | None = None, book_ids: list[int] | None = None
+    ) -> dict | None:
+        """Update an active author in one transaction; returns it as a dict, or None if it doesn't exist.
+
+        Empty fields keep their value, `book_ids` replaces the links when given.
+        """
+        values = {key: value for key, value in {"name": name}.items() if value}
+        if book_ids:
+            return await cls._write(session, author_id, values, add=book_ids, remove=None)
+        return await cls._write(session, author_id, values)
+
+    @classmethod
+    async def _write(cls, session: AsyncSession, author_id: int, values: dict, add: list[int] = (), remove=()):
+        """Update `values` of an active author and change its links (see `relink_rows`) in one transaction."""
+        table = cls.__table__
+        columns = [table.c.id, table.c.name]
+        query = update(table).values(values).returning(*columns) if values else select(*columns)
+        row = (await session.execute(query.where(table.c.id == author_id, table.c.is_active == True))).one_or_none()
+        if row is None:
+            await session.rollback()
+            return None
+        removed, added, books = await relink_rows(
+            session, *cls._link_columns(), author_id, ["id", "title"], add, remove
+        )
+        author = {**row._mapping, "books": books[:fastapi_config.RELATED_ITEMS_MAX], "books_count": len(books)}
+        if not values and not removed and not added:
+            await session.rollback()
+            return author
+        await session.commit()
+        # Books linked before or after the write embed the old name; when only links change,
+        # only the books linked or unlinked need a refresh
+        related_ids = removed.union(book["id"] for book in books) if values else removed | added
+        await cls._cache_write(author, related_ids, relinked=bool(added or removed))
+        return author
+
+    @classmethod
+    async def bulk_create(cls, session: AsyncSession, authors: list[dict]) -> list[int]:
+        """Insert authors given as dicts of name and book_ids; returns their ids in order."""
+        ids = await insert_rows(session, cls.__table__, [{"name": author["name"]} for author in authors])
+        links = {author_id: author["book_ids"] for author_id, author in zip(ids, authors) if author.get("book_ids")}
+        await insert_links(session, *cls._link_columns(), links)
+        await session.commit()
+        await cls._evict_bulk(ids, set(chain(*links.values())), relinked=bool(links))
+        return ids
+
+    @classmethod
+    async def bulk_update(cls, session: AsyncSession, authors: list[dict]) -> list[int]:
+        """Apply partial updates (id plus any of name, book_ids) to many authors at once.
+
+        Returns the ids that don't exist or are deleted, in which case nothing is written.
+        """
+        ids = [author["id"] for author in authors]
+        updated = await update_rows(session, cls.__table__, [cls.__table__.c.name], authors)
+        missing = sorted(set(ids) - set(updated))
+        if missing:
+            await session.rollback()
+            return missing
+        # Books linked before the update embed the old name in their cached representation
+        related_ids = await linked_ids(session, *cls._link_columns(), ids)
+        links = {author["id"]: author["book_ids"] for author in authors if author.get("book_ids")}
+        await replace_links(session, *cls._link_columns(), links)
         await session.commit()
-        await session.refresh(self)
+        await cls._evict_bulk(ids, related_ids.union(*links.values()), relinked=bool(links))
+        return []
+
+    @classmethod
+    async def bulk_delete(cls, session: AsyncSession, author_ids: list[int]) -> list[int]:
+        """Soft-delete many authors at once; returns the ids that don't exist, in which case nothing is written."""
+        deleted = await deactivate_rows(session, cls.__table__, author_ids)
+        missing = sorted(set(author_ids) - set(deleted))
+        if missing:
+            await session.rollback()
+            return missing
+        related_ids = await linked_ids(session, *cls._link_columns(), author_ids)
+        await session.commit()
+        await cls._evict_bulk(author_ids, related_ids, relinked=False)
+        return []
+
+    @staticmethod
+    def _link_columns():
+        return book_author_association.c.author_id, book_author_association.c.book_id
+
+    @staticmethod
+    def _related_tags(book_ids):
+        # Entries of a book embed only the first RELATED_ITEMS_MAX authors but count all of them, so they are not
+        # tagged with every author whose link or deletion changes the count
+        return [f"book:{book_id}" for book_id in book_ids]
+
+    @classmethod
+    async def _evict_bulk(cls, author_ids, book_ids, relinked: bool):
+        await author_cache.delete(*author_ids)
+        await book_cache.delete(*book_ids)
+        types = ["Author", "Book"] if relinked else ["Author"]
+        await invalidate_tags(*[graphql_type_tag(name) for name in types], *cls._related_tags(book_ids))
+
+    @classmethod
+    async def _cache_write(cls, author: dict, book_ids, relinked: bool):
+        await book_cache.delete(*book_ids)
+        await author_cache.set(author["id"], author)
+        types = ["Author", "Book"] if relinked else ["Author"]
+        await invalidate_tags(*[graphql_type_tag(name) for name in types], *cls._related_tags(book_ids))
+
+    @classmethod
+    async def delete_by_id(cls, session: AsyncSession, author_id: int):
+        return 404 if await cls.bulk_delete(session, [author_id]) else 200
 
     def to_dict(self):
         return {
@@ -1,15 +1,29 @@
-from sqlalchemy import Table, Column, String, Integer, ForeignKey, Boolean, select
-from sqlalchemy.orm import relationship, selectinload
+from itertools import chain
+
+from sqlalchemy import (
+    Table, Column, String, Integer, ForeignKey, Boolean, Computed, Index, text,
+    select, insert, update, func, or_, cast,
+)
+from sqlalchemy.dialects.postgresql import TSVECTOR, REGCONFIG
+from sqlalchemy.orm import relationship, selectinload, deferred
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from api import fastapi_config
 from api.database.database import Base
+from api.database.pagination import paginate
+from api.models.bulk import (
+    deactivate_rows, insert_links, insert_rows, linked_ids, related_rows, relink_rows, replace_links, update_rows
+)
+from api.redis import book_cache, author_cache, change_sequence, graphql_type_tag, invalidate_tags
 
 
 book_author_association = Table(
     "book_author_association",
     Base.metadata,
-    Column("book_id", Integer, ForeignKey("books.id")),
-    Column("author_id", Integer, ForeignKey("authors.id"))
+    # The primary key serves lookups by book, the index lookups by author
+    Column("book_id", Integer, ForeignKey("books.id"), primary_key=True),
+    Column("author_id", Integer, ForeignKey("authors.id"), primary_key=True),
+    Index("ix_book_author_association_author_id", "author_id", "book_id"),
 )
 
 
@@ -22,14 +36,155 @@ class BookModel(Base):
         "AuthorModel", secondary=book_author_association, back_populates="books")
     is_active = Column(Boolean, default=True)
     description = Column(String)
+    search_vector = deferred(Column(TSVECTOR, Computed(
+        "setweight(to_tsvector('english', coalesce(title, '')), 'A') || "
+        "setweight(to_tsvector('english', coalesce(description, '')), 'B')",
+        persisted=True,
+    )))
+
+    __table_args__ = (
+        Index("ix_books_search_vector", "search_vector", postgresql_using="gin"),
+        Index("ix_books_title_trgm", "title", postgresql_using="gin", postgresql_ops={"title": "gin_trgm_ops"}),
+        # Keyset pages of active books, by id and by title
+        Index("ix_books_active_id", "id", postgresql_where=text("is_active")),
+        Index("ix_books_active_title", "title", "id", postgresql_where=text("is_active")),
+    )
+
+    sort_keys = ("id", "title")
+    # Columns a client can pick with a sparse fieldset
+    field_names = ("id", "title", "description")
 
     @classmethod
-    async def return_all(cls, session: AsyncSession):
+    async def return_all(cls, session: AsyncSession, options: list | None = None):
+        """All active rows; `options` replaces the default eager load of authors."""
         result = await session.execute(
-            select(cls).where(cls.is_active == True).options(selectinload(cls.authors))
+            select(cls).where(cls.is_active == True)
+            .options(*(options if options is not None else [selectinload(cls.authors)]))
         )
         return result.scalars().all()
 
+    @classmethod
+    def _filter(cls, query, title: str | None = None, author_id: int | None = None, is_active: bool | None = True):
+        if is_active is not None:
+            query = query.where(cls.is_active == is_active)
+        if title:
+            query = query.where(cls.title.ilike(f"%{title}%"))
+        if author_id is not None:
+            query = query.where(cls.id.in_(
+                select(book_author_association.c.book_id).where(book_author_association.c.author_id == author_id)
+            ))
+        return query
+
+    @classmethod
+    async def get_page(
+        cls,
+        session: AsyncSession,
+        limit: int,
+        after: str | None = None,
+        sort: str = "id",
+        options: list | None = None,
+        **filters,
+    ):
+        """A keyset page of books matching `filters` (see `_filter`); `options` replaces the default eager load."""
+        query = cls._filter(select(cls), **filters)
+        query = query.options(*(options if options is not None else [selectinload(cls.authors)]))
+        columns = {key: getattr(cls, key) for key in cls.sort_keys}
+        return await paginate(session, query, columns, cls.id, limit, after, sort)
+
+    @classmethod
+    async def get_page_dicts(
+        cls, session: AsyncSession, limit: int, after: str | None = None, sort: str = "id", **filters
+    ):
+        """Like `get_page`, but only ids come from the database; the entities are read from the entity cache."""
+        columns = {key: getattr(cls, key) for key in cls.sort_keys}
+        query = cls._filter(select(*columns.values()), **filters)
+        rows, next_cursor = await paginate(session, query, columns, cls.id, limit, after, sort)
+        return await cls.get_dicts(session, [row.id for row in rows]), next_cursor
+
+    @classmethod
+    async def get_page_fields(
+        cls,
+        session: AsyncSession,
+        limit: int,
+        after: str | None = None,
+        sort: str = "id",
+        fields: list[str] = field_names,
+        with_authors: bool = False,
+        **filters,
+    ):
+        """Like `get_page_dicts`, but only `fields` are selected and authors are only loaded if `with_authors`.
+
+        The entity cache holds whole books, so it is bypassed.
+        """
+        columns = {key: getattr(cls, key) for key in cls.sort_keys}
+        selected = {**columns, **{field: getattr(cls, field) for field in fields}}
+        query = cls._filter(select(*selected.values()), **filters)
+        rows, next_cursor = await paginate(session, query, columns, cls.id, limit, after, sort)
+        return await cls._field_dicts(session, rows, fields, with_authors), next_cursor
+
+    @classmethod
+    async def get_fields(
+        cls, session: AsyncSession, book_id: int, fields: list[str] = field_names, with_authors: bool = False
+    ):
+        """`fields` of an active book, with its authors if `with_authors`; None if it doesn't exist."""
+        result = await session.execute(
+            select(*[getattr(cls, field) for field in fields]).where(cls.id == book_id, cls.is_active == True)
+        )
+        books = await cls._field_dicts(session, result.all(), fields, with_authors)
+        return books[0] if books else None
+
+    @classmethod
+    async def _field_dicts(cls, session: AsyncSession, rows, fields: list[str], with_authors: bool):
+        """`fields` of `rows` as dicts, with the first RELATED_ITEMS_MAX authors and their count if `with_authors`."""
+        books = [{field: row._mapping[field] for field in fields} for row in rows]
+        if with_authors and books:
+            authors, counts = await related_rows(
+                session, *cls._link_columns(), [book["id"] for book in books], ["id", "name"],
+                fastapi_config.RELATED_ITEMS_MAX,
+            )
+            for book in books:
+                book["authors"] = authors[book["id"]]
+                book["authors_count"] = counts[book["id"]]
+        return books
+
+    @classmethod
+    async def count(cls, session: AsyncSession, **filters):
+        result = await session.execute(cls._filter(select(func.count(cls.id)), **filters))
+        return result.scalar_one()
+
+    @classmethod
+    async def stream_dicts(cls, session: AsyncSession, batch_size: int, **filters):
+        """Every book matching `filters` as a dict, read through a server-side cursor `batch_size` rows at a time."""
+        result = await session.stream_scalars(
+            cls._filter(select(cls), **filters).order_by(cls.id)
+            .options(selectinload(cls.authors))
+            .execution_options(yield_per=batch_size)
+        )
+        async for book in result:
+            yield book.to_dict()
+
+    @classmethod
+    async def get_dicts(cls, session: AsyncSession, book_ids: list[int]):
+        books = await book_cache.get_many(book_ids)
+        missing = [book_id for book_id in book_ids if book_id not in books]
+        if missing:
+            since = await change_sequence()
+            result = await session.execute(
+                select(*[getattr(cls, field) for field in cls.field_names])
+                .where(cls.id.in_(missing), cls.is_active == True)
+            )
+            loaded = {
+                book["id"]: book for book in await cls._field_dicts(session, result.all(), cls.field_names, True)
+            }
+            await book_cache.fill_many(loaded, since, session)
+            books.update(loaded)
+        return [books[book_id] for book_id in book_ids if book_id in books]
+
+    @classmethod
+    async def get_dict(cls, session: AsyncSession, book_id: int):
+        books = await cls.get_dicts(session, [book_id])
+        return books[0] if books else None
+
     @classmethod
     async def get_by_id(cls, session: AsyncSession, book_id: int):
         result = await session.execute(
@@ -45,27 +200,200 @@ class BookModel(Base):
         )
         return result.scalars().all()
 
+    @classmethod
+    async def get_by_author_ids(cls, session: AsyncSession, author_ids: list[int]):
+        """Books of each author, in the order of `author_ids`, fetched in a single query."""
+        result = await session.execute(
+            select(book_author_association.c.author_id, cls)
+            .join(book_author_association, book_author_association.c.book_id == cls.id)
+            .where(book_author_association.c.author_id.in_(author_ids))
+            .order_by(cls.id)
+        )
+        books = {author_id: [] for author_id in author_ids}
+        for author_id, book in result.all():
+            books[author_id].append(book)
+        return [books[author_id] for author_id in author_ids]
+
     @classmethod
     async def get_by_title(cls, session: AsyncSession, title: str):
         result = await session.execute(
-            select(cls).where(cls.title.like(f"%{title.capitalize()}%"), cls.is_active == True)
+            select(cls).where(cls.title.ilike(f"%{title}%"), cls.is_active == True)
             .options(selectinload(cls.authors))
         )
         return result.scalars().all()
 
     @classmethod
-    async def delete_by_id(cls, session: AsyncSession, book_id: int):
-        book = await cls.get_by_id(session, book_id)
-        if book:
-            book.is_active = False
-            await book.save_to_db(session)
-            return 200
-        return 404
-
-    async def save_to_db(self, session: AsyncSession):
-        session.add(self)
+    async def search(cls, session: AsyncSession, text: str, limit: int):
+        """Rank active books by full-text match on title and description, or by trigram similarity of the title."""
+        query = func.websearch_to_tsquery(cast("english", REGCONFIG), text)
+        rank = func.greatest(func.ts_rank(cls.search_vector, query), func.similarity(cls.title, text)).label("rank")
+        result = await session.execute(
+            select(cls.id, rank)
+            .where(cls.is_active == True, or_(cls.search_vector.op("@@")(query), cls.title.op("%")(text)))
+            .order_by(rank.desc(), cls.id)
+            .limit(limit)
+        )
+        return result.all()
+
+    @classmethod
+    async def active_ids(cls, session: AsyncSession, book_ids: list[int]) -> set[int]:
+        result = await session.execute(select(cls.id).where(cls.id.in_(book_ids), cls.is_active == True))
+        return set(result.scalars())
+
+    @classmethod
+    async def create(
+        cls,
+        session: AsyncSession,
+        title: str,
+        description: str | None = None,
+        author_ids: list[int] | None = None,
+    ) -> dict:
+        """Insert a book linked to the active authors among `author_ids` in one transaction; returns it as a dict."""
+        table = cls.__table__
+        columns = [table.c.id, table.c.title, table.c.description]
+        result = await session.execute(insert(table).values(title=title, description=description).returning(*columns))
+        row = result.one()
+        authors = []
+        if author_ids:
+            _, _, authors = await relink_rows(session, *cls._link_columns(), row.id, ["id", "name"], add=author_ids)
         await session.commit()
-        await session.refresh(self)
+        book = {**row._mapping, "authors": authors[:fastapi_config.RELATED_ITEMS_MAX], "authors_count": len(authors)}
+        await cls._cache_write(book, [author["id"] for author in authors], relinked=bool(authors))
+        return book
+
+    @classmethod
+    async def update(
+        cls,
+        session: AsyncSession,
+        book_id: int,
+        title: str | None = None,
+        description: str | None = None,
+        author_ids: list[int] | None = None,
+    ) -> dict | None:
+        """Update an active book in one transaction; returns it as a dict, or None if it doesn't exist.
+
+        Empty fields keep their value, `author_ids` replaces the links when given.
+        """
+        values = {key: value for key, value in {"title": title, "description": description}.items() if value}
+        if author_ids:
+            book, _ = await cls._write(session, book_id, values, add=author_ids, remove=None)
+        else:
+            book, _ = await cls._write(session, book_id, values)
+        return book
+
+    @classmethod
+    async def link_author(cls, session: AsyncSession, book_id: int, author_id: int) -> tuple[dict | None, bool]:
+        """Link an active author to an active book unless they are linked already.
+
+        Returns the book as a dict (None if it doesn't exist) and whether the author was linked by this call.
+        """
+        return await cls._write(session, book_id, {}, add=[author_id])
+
+    @classmethod
+    async def unlink_author(cls, session: AsyncSession, book_id: int, author_id: int) -> tuple[dict | None, bool]:
+        """Unlink an author from an active book.
+
+        Returns the book as a dict (None if it doesn't exist) and whether the author was unlinked by this call.
+        """
+        return await cls._write(session, book_id, {}, remove=[author_id])
+
+    @classmethod
+    async def _write(cls, session: AsyncSession, book_id: int, values: dict, add: list[int] = (), remove=()):
+        """Update `values` of an active book and change its links (see `relink_rows`) in one transaction.
+
+        Returns the book as a dict (None if it doesn't exist) and whether anything was written.
+        """
+        table = cls.__table__
+        columns = [table.c.id, table.c.title, table.c.description]
+        query = update(table).values(values).returning(*columns) if values else select(*columns)
+        row = (await session.execute(query.where(table.c.id == book_id, table.c.is_active == True))).one_or_none()
+        if row is None:
+            await session.rollback()
+            return None, False
+        removed, added, authors = await relink_rows(session, *cls._link_columns(), book_id, ["id", "name"], add, remove)
+        book = {**row._mapping, "authors": authors[:fastapi_config.RELATED_ITEMS_MAX], "authors_count": len(authors)}
+        if not values and not removed and not added:
+            await session.rollback()
+            return book, False
+        await session.commit()
+        # Authors linked before or after the write embed the old title and description; when only links change,
+        # only the authors linked or unlinked need a refresh
+        related_ids = removed.union(author["id"] for author in authors) if values else removed | added
+        await cls._cache_write(book, related_ids, relinked=bool(added or removed))
+        return book, True
+
+    @classmethod
+    async def bulk_create(cls, session: AsyncSession, books: list[dict]) -> list[int]:
+        """Insert books given as dicts of title, description and author_ids; returns their ids in order."""
+        ids = await insert_rows(
+            session, cls.__table__, [{"title": book["title"], "description": book.get("description")} for book in books]
+        )
+        links = {book_id: book["author_ids"] for book_id, book in zip(ids, books) if book.get("author_ids")}
+        await insert_links(session, *cls._link_columns(), links)
+        await session.commit()
+        await cls._evict_bulk(ids, set(chain(*links.values())), relinked=bool(links))
+        return ids
+
+    @classmethod
+    async def bulk_update(cls, session: AsyncSession, books: list[dict]) -> list[int]:
+        """Apply partial updates (id plus any of title, description, author_ids) to many books at once.
+
+        Returns the ids that don't exist or are deleted, in which case nothing is written.
+        """
+        ids = [book["id"] for book in books]
+        updated = await update_rows(session, cls.__table__, [cls.__table__.c.title, cls.__table__.c.description], books)
+        missing = sorted(set(ids) - set(updated))
+        if missing:
+            await session.rollback()
+            return missing
+        # Authors linked before the update embed the old title and description in their cached representation
+        related_ids = await linked_ids(session, *cls._link_columns(), ids)
+        links = {book["id"]: book["author_ids"] for book in books if book.get("author_ids")}
+        await replace_links(session, *cls._link_columns(), links)
+        await session.commit()
+        await cls._evict_bulk(ids, related_ids.union(*links.values()), relinked=bool(links))
+        return []
+
+    @classmethod
+    async def bulk_delete(cls, session: AsyncSession, book_ids: list[int]) -> list[int]:
+        """Soft-delete many books at once; returns the ids that don't exist, in which case nothing is written."""
+        deleted = await deactivate_rows(session, cls.__table__, book_ids)
+        missing = sorted(set(book_ids) - set(deleted))
+        if missing:
+            await session.rollback()
+            return missing
+        related_ids = await linked_ids(session, *cls._link_columns(), book_ids)
+        await session.commit()
+        await cls._evict_bulk(book_ids, related_ids, relinked=False)
+        return []
+
+    @staticmethod
+    def _link_columns():
+        return book_author_association.c.book_id, book_author_association.c.author_id
+
+    @staticmethod
+    def _related_tags(author_ids):
+        # Entries of an author embed only the first RELATED_ITEMS_MAX books but count all of them, so they are not
+        # tagged with every book whose link or deletion changes the count
+        return [f"author:{author_id}" for author_id in author_ids]
+
+    @classmethod
+    async def _evict_bulk(cls, book_ids, author_ids, relinked: bool):
+        await book_cache.delete(*book_ids)
+        await author_cache.delete(*author_ids)
+        types = ["Book", "Author"] if relinked else ["Book"]
+        await invalidate_tags(*[graphql_type_tag(name) for name in types], *cls._related_tags(author_ids))
+
+    @classmethod
+    async def _cache_write(cls, book: dict, author_ids, relinked: bool):
+        await author_cache.delete(*author_ids)
+        await book_cache.set(book["id"], book)
+        types = ["Book", "Author"] if relinked else ["Book"]
+        await invalidate_tags(*[graphql_type_tag(name) for name in types], *cls._related_tags(author_ids))
+
+    @classmethod
+    async def delete_by_id(cls, session: AsyncSession, book_id: int):
+        return 404 if await cls.bulk_delete(session, [book_id]) else 200
 
     def to_dict(self):
         return {
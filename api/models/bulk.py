@@ -0,0 +1,173 @@
+"""Set-based statements shared by the models' read and write methods.
+
+Each helper issues a fixed number of statements however many rows it is given, and leaves the commit
+(and the cache work that follows it) to the caller.
+"""
+from sqlalchemy import (
+    Column, Integer, Table, any_, column, delete, exists, func, insert, literal, or_, select, update, values
+)
+from sqlalchemy.dialects.postgresql import ARRAY, insert as pg_insert
+
+
+async def insert_rows(session, table: Table, rows: list[dict]) -> list[int]:
+    """Insert `rows` and return their new ids, in the order of `rows`."""
+    result = await session.execute(insert(table).returning(table.c.id, sort_by_parameter_order=True), rows)
+    return list(result.scalars())
+
+
+async def update_rows(session, table: Table, fields: list[Column], rows: list[dict]) -> list[int]:
+    """Update the active rows identified by `rows[i]["id"]` in one UPDATE ... FROM (VALUES ...).
+
+    Fields that are None in a row keep their current value. Returns the ids that were updated.
+    """
+    changes = values(
+        column("id", Integer), *[column(field.key, field.type) for field in fields], name="changes"
+    ).data([(row["id"], *[row.get(field.key) for field in fields]) for row in rows])
+    result = await session.execute(
+        update(table)
+        .where(table.c.id == changes.c.id, table.c.is_active == True)
+        .values({field.key: func.coalesce(changes.c[field.key], field) for field in fields})
+        .returning(table.c.id)
+    )
+    return list(result.scalars())
+
+
+async def deactivate_rows(session, table: Table, ids: list[int]) -> list[int]:
+    """Soft-delete the active rows among `ids` and return the ids that were deactivated."""
+    result = await session.execute(
+        update(table)
+        .where(table.c.id.in_(ids), table.c.is_active == True)
+        .values(is_active=False)
+        .returning(table.c.id)
+    )
+    return list(result.scalars())
+
+
+async def linked_ids(session, owner: Column, other: Column, owner_ids: list[int]) -> set[int]:
+    """Ids on the `other` side of the association linked to any of `owner_ids`."""
+    result = await session.execute(select(other).where(owner.in_(owner_ids)).distinct())
+    return set(result.scalars())
+
+
+async def related_rows(
+    session, owner: Column, other: Column, owner_ids: list[int], fields: list[str], limit: int | None = None
+) -> tuple[dict, dict]:
+    """`fields` of the first `limit` active rows (by id) linked to each of `owner_ids`, and how many there are.
+
+    Returns two dicts keyed by owner id: the rows as lists of dicts, and their counts. Rows are numbered and counted
+    per owner by window functions, so no more than `limit` of them per owner leave the database.
+    """
+    target = _target(other)
+    linked = (
+        select(
+            owner.label("owner_id"),
+            *[target.c[field] for field in fields],
+            func.row_number().over(partition_by=owner, order_by=target.c.id).label("position"),
+            func.count().over(partition_by=owner).label("total"),
+        )
+        .join(target, other == target.c.id)
+        .where(owner.in_(owner_ids), target.c.is_active == True)
+        .subquery("linked")
+    )
+    query = select(linked).order_by(linked.c.owner_id, linked.c.id)
+    if limit is not None:
+        query = query.where(linked.c.position <= limit)
+    rows = {owner_id: [] for owner_id in owner_ids}
+    counts = dict.fromkeys(owner_ids, 0)
+    for row in await session.execute(query):
+        rows[row.owner_id].append({field: row._mapping[field] for field in fields})
+        counts[row.owner_id] = row.total
+    return rows, counts
+
+
+async def insert_links(session, owner: Column, other: Column, links: dict[int, list[int]]):
+    """Add the associations of owners that have none yet, such as rows inserted in the same transaction."""
+    rows = [
+        {owner.key: owner_id, other.key: other_id}
+        for owner_id, other_ids in links.items()
+        for other_id in dict.fromkeys(other_ids)
+    ]
+    if rows:
+        await session.execute(insert(owner.table), rows)
+
+
+async def replace_links(session, owner: Column, other: Column, links: dict[int, list[int]]):
+    """Make `links[owner_id]` the complete list of associations of each owner in `links`.
+
+    Only the associations that change are deleted or inserted. The pairs are sent as two arrays, so the
+    statements have the same few parameters however many links there are.
+    """
+    if not links:
+        return
+    pairs = [(owner_id, other_id) for owner_id, other_ids in links.items() for other_id in dict.fromkeys(other_ids)]
+    wanted = select(
+        func.unnest(literal([owner_id for owner_id, _ in pairs], ARRAY(Integer))).label("owner_id"),
+        func.unnest(literal([other_id for _, other_id in pairs], ARRAY(Integer))).label("other_id"),
+    ).subquery("wanted")
+    await session.execute(
+        delete(owner.table).where(
+            owner == any_(literal(list(links), ARRAY(Integer))),
+            ~exists().where(wanted.c.owner_id == owner, wanted.c.other_id == other),
+        )
+    )
+    await session.execute(
+        pg_insert(owner.table)
+        .from_select([owner.key, other.key], select(wanted.c.owner_id, wanted.c.other_id))
+        .on_conflict_do_nothing()
+    )
+
+
+def _target(other: Column) -> Table:
+    """The table the `other` side of an association points to."""
+    return next(iter(other.foreign_keys)).column.table
+
+
+async def relink_rows(
+    session,
+    owner: Column,
+    other: Column,
+    owner_id: int,
+    fields: list[str],
+    add: list[int] = (),
+    remove: list[int] | None = (),
+):
+    """Link `owner_id` to the active rows among `add` and unlink it from `remove` (None: from every row not in `add`).
+
+    Only the associations that change are written: one DELETE ... RETURNING when something is removed, and an
+    INSERT ... ON CONFLICT DO NOTHING of the wanted links run as a CTE of the query reading back `fields` of every
+    active linked row.
+    Returns the ids unlinked, the ids newly linked and the linked rows, ordered by id.
+    """
+    target = _target(other)
+    active = select(target.c.id).where(target.c.id.in_(add), target.c.is_active == True)
+    removed = set()
+    if remove is None or remove:
+        result = await session.execute(
+            delete(owner.table)
+            .where(owner == owner_id, other.not_in(active) if remove is None else other.in_(remove))
+            .returning(other)
+        )
+        removed = set(result.scalars())
+
+    linked = target.c.id.in_(select(other).where(owner == owner_id))
+    is_added = literal(False)
+    if add:
+        candidates = active.subquery("candidates")
+        added = (
+            pg_insert(owner.table)
+            .from_select([owner.key, other.key], select(literal(owner_id, Integer), candidates.c.id))
+            .on_conflict_do_nothing()
+            .returning(other)
+            .cte("added")
+        )
+        is_added = target.c.id.in_(select(added.c[other.key]))
+        linked = or_(linked, is_added)
+    columns = {"id": target.c.id, **{field: target.c[field] for field in fields}}
+    result = await session.execute(
+        select(*columns.values(), is_added.label("added"))
+        .where(linked, target.c.is_active == True)
+        .order_by(target.c.id)
+    )
+    rows = result.all()
+    added_ids = {row.id for row in rows if row.added}
+    return removed, added_ids, [{field: row._mapping[field] for field in fields} for row in rows]
@@ -1,8 +1,15 @@
 from passlib.hash import pbkdf2_sha256 as sha256
-from sqlalchemy import Column, Integer, String, Boolean, select
+from sqlalchemy import Column, Integer, String, Boolean, Index, text, select, insert, update, func
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from api.database.database import Base
+from api.database.pagination import paginate
+from api.hashing import hash_password, verify_password
+from api.redis import graphql_type_tag, invalidate_local, invalidate_tags
+
+
+def user_cache_key(login: str) -> str:
+    return f"user:{login}"
 
 
 class UserModel(Base):
@@ -15,14 +22,47 @@ class UserModel(Base):
     is_admin = Column(Boolean(), default=False)
     email = Column(String(), unique=True)
 
+    __table_args__ = (
+        Index("ix_users_active_id", "id", postgresql_where=text("is_active")),
+    )
+
+    sort_keys = ("id", "login")
+
     def __repr__(self):
         return f"<UserModel(id={self.id}, name='{self.name}')>"
 
     @classmethod
-    async def return_all(cls, session: AsyncSession):
-        result = await session.execute(select(cls).where(cls.is_active == True))
+    async def return_all(cls, session: AsyncSession, options: list | None = None):
+        result = await session.execute(select(cls).where(cls.is_active == True).options(*(options or [])))
         return result.scalars().all()
 
+    @classmethod
+    def _filter(cls, query, login_contains: str | None = None, is_active: bool | None = True):
+        if is_active is not None:
+            query = query.where(cls.is_active == is_active)
+        if login_contains:
+            query = query.where(cls.login.ilike(f"%{login_contains}%"))
+        return query
+
+    @classmethod
+    async def get_page(
+        cls,
+        session: AsyncSession,
+        limit: int,
+        after: str | None = None,
+        sort: str = "id",
+        options: list | None = None,
+        **filters,
+    ):
+        query = cls._filter(select(cls), **filters).options(*(options or []))
+        columns = {key: getattr(cls, key) for key in cls.sort_keys}
+        return await paginate(session, query, columns, cls.id, limit, after, sort)
+
+    @classmethod
+    async def count(cls, session: AsyncSession, **filters):
+        result = await session.execute(cls._filter(select(func.count(cls.id)), **filters))
+        return result.scalar_one()
+
     @classmethod
     async def get_by_id(cls, session: AsyncSession, user_id: int):
         result = await session.execute(
@@ -37,19 +77,83 @@ class UserModel(Base):
         )
         return result.scalar_one_or_none()
 
-    async def save_to_db(self, session: AsyncSession):
-        session.add(self)
+    @classmethod
+    def _columns(cls):
+        table = cls.__table__
+        return [table.c.id, table.c.login, table.c.name, table.c.email, table.c.is_active, table.c.is_admin]
+
+    @classmethod
+    async def create(
+        cls, session: AsyncSession, name: str, login: str, hashed_password: str, email: str | None = None
+    ) -> dict:
+        """Insert a user with a single INSERT ... RETURNING; returns it as a dict (see `to_dict`)."""
+        result = await session.execute(
+            insert(cls.__table__)
+            .values(name=name, login=login, hashed_password=hashed_password, email=email)
+            .returning(*cls._columns())
+        )
+        user = dict(result.one()._mapping)
+        await session.commit()
+        await cls._cache_write(user["login"])
+        return user
+
+    @classmethod
+    async def update(cls, session: AsyncSession, user_id: int, **fields) -> tuple[dict, dict] | None:
+        """Update an active user with a single UPDATE ... RETURNING; empty fields keep their value.
+
+        Returns the user as a dict along with its login and admin status from before the update,
+        or None if it doesn't exist.
+        """
+        table = cls.__table__
+        # Joined to itself, the table shows the row as it was before the update
+        previous = table.alias("previous")
+        result = await session.execute(
+            update(table)
+            .where(table.c.id == user_id, table.c.is_active == True, previous.c.id == table.c.id)
+            .values({key: value for key, value in fields.items() if value or value is False})
+            .returning(
+                *cls._columns(),
+                previous.c.login.label("previous_login"),
+                previous.c.is_admin.label("previous_is_admin"),
+            )
+        )
+        row = result.one_or_none()
+        if row is None:
+            await session.rollback()
+            return None
+        await session.commit()
+        user = dict(row._mapping)
+        previous = {"login": user.pop("previous_login"), "is_admin": user.pop("previous_is_admin")}
+        await cls._cache_write(user["login"], previous["login"])
+        return user, previous
+
+    @classmethod
+    async def deactivate(cls, session: AsyncSession, user_id: int) -> dict | None:
+        """Soft-delete an active user; returns it as a dict, or None if it doesn't exist."""
+        table = cls.__table__
+        result = await session.execute(
+            update(table)
+            .where(table.c.id == user_id, table.c.is_active == True)
+            .values(is_active=False)
+            .returning(*cls._columns())
+        )
+        row = result.one_or_none()
+        if row is None:
+            await session.rollback()
+            return None
         await session.commit()
-        await session.refresh(self)
+        await cls._cache_write(row.login)
+        return dict(row._mapping)
+
+    @staticmethod
+    async def _cache_write(*logins: str):
+        # Cached records under both the old and the new login
+        await invalidate_local(*[user_cache_key(login) for login in set(logins)])
+        await invalidate_tags(graphql_type_tag("User"))
 
     @classmethod
     async def delete_by_id(cls, session: AsyncSession, user_id: int):
-        user = await cls.get_by_id(session, user_id)
-        if user:
-            user.is_active = False
-            await user.save_to_db(session)
-            return 200
-        return 404
+        return 200 if await cls.deactivate(session, user_id) else 404
 
     @staticmethod
     def generate_hash(password):
@@ -59,6 +163,15 @@ class UserModel(Base):
     def verify_hash(password, password_hash):
         return sha256.verify(password, password_hash)
 
+    @staticmethod
+    async def generate_hash_async(password):
+        """Hash in the password hashing pool instead of blocking the event loop."""
+        return await hash_password(password)
+
+    @staticmethod
+    async def verify_hash_async(password, password_hash):
+        return await verify_password(password, password_hash)
+
     def to_dict(self):
         return {
             "id": self.id,
@@ -1,34 +1,415 @@
+from collections import OrderedDict
 from functools import wraps
+import asyncio
+import hashlib
 import json
+import logging
+import time
+import uuid
 
 from redis import asyncio as aioredis
+from sqlalchemy.ext.asyncio import AsyncSession
 
+from api import fastapi_config
+from api.database.database import engine
+
+
+logger = logging.getLogger(__name__)
 
 redis_connection = aioredis.Redis(host="redis", port=6379, db=1)
 
+CACHE_SOFT_TTL = 60
+CACHE_HARD_TTL = 300
+CACHE_LOCK_LEASE = 10
+CACHE_LOCK_POLL_INTERVAL = 0.05
+ENTITY_TTL = 600
+ENTITY_VERSION = 2  # part of the entity cache keys; bump it when the shape of cached entities changes
+INVALIDATION_CHANNEL = "cache:invalidate"
+RELEASE_LOCK_SCRIPT = """
+if redis.call("get", KEYS[1]) == ARGV[1] then
+    return redis.call("del", KEYS[1])
+end
+return 0
+"""
+CHANGE_SEQUENCE_KEY = "cache:changes"
+CHANGE_MARKER_TTL = 3600  # longer than any fill takes
+# KEYS[1] is the entry, followed by the "changed" and "changing" keys of everything it depends on
+STORE_UNCHANGED_SCRIPT = """
+for i = 2, #KEYS, 2 do
+    if tonumber(redis.call("get", KEYS[i]) or 0) > tonumber(ARGV[3])
+        or (ARGV[4] == "1" and redis.call("exists", KEYS[i + 1]) == 1) then
+        return 0
+    end
+end
+redis.call("set", KEYS[1], ARGV[1], "EX", ARGV[2])
+return 1
+"""
+# Arguments that identify the caller rather than the query; the caller only contributes its scope to the key
+UNCACHED_ARGS = ("current_user", "session")
+
+
+def _scope(kwargs: dict) -> str:
+    user = kwargs.get("current_user")
+    if user is None:
+        return "anonymous"
+    return "admin" if user.is_admin else "user"
+
+
+def _params(kwargs: dict) -> dict:
+    return {k: v for k, v in kwargs.items() if k not in UNCACHED_ARGS and v is not None}
+
+
+def cache_key(namespace: str, kwargs: dict) -> str:
+    params = json.dumps(_params(kwargs), sort_keys=True, default=str)
+    digest = hashlib.sha1(params.encode()).hexdigest()
+    return f"cache:{namespace}:{_scope(kwargs)}:{digest}"
+
+
+class LocalCache:
+    """Per-process LRU bounded by entry count and by the size of the serialized values.
+
+    Values are kept deserialized, so callers must treat them as read-only.
+    """
+
+    def __init__(self, max_entries: int, max_bytes: int):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._entries = OrderedDict()
+
+    def get(self, key: str):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        value, size, expires_at = entry
+        if expires_at <= time.monotonic():
+            self.discard(key)
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def set(self, key: str, value, size: int, ttl: float):
+        self.discard(key)
+        if size > self.max_bytes:
+            return
+        self._entries[key] = (value, size, time.monotonic() + ttl)
+        self.size += size
+        while len(self._entries) > self.max_entries or self.size > self.max_bytes:
+            _, (_, evicted_size, _) = self._entries.popitem(last=False)
+            self.size -= evicted_size
+
+    def discard(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.size -= entry[1]
+
+    def clear(self):
+        self._entries.clear()
+        self.size = 0
+
+
+_background_tasks = set()
+local_cache = LocalCache(fastapi_config.LOCAL_CACHE_MAX_ENTRIES, fastapi_config.LOCAL_CACHE_MAX_BYTES)
+
+
+def _spawn(coro):
+    task = asyncio.create_task(coro)
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+
+
+async def wait_for_background_tasks():
+    """Let pending background refreshes finish, for event loops that close afterwards."""
+    await asyncio.gather(*_background_tasks, return_exceptions=True)
+
+
+def _reads_replica(session) -> bool:
+    return session is not None and session.bind is not engine
+
+
+def _change_keys(name: str) -> tuple[str, str]:
+    return f"cache:changed:{name}", f"cache:changing:{name}"
+
+
+async def change_sequence() -> int:
+    """The number of the last recorded change; read it before computing a value to store with `_store_unchanged`."""
+    return int(await redis_connection.get(CHANGE_SEQUENCE_KEY) or 0)
+
+
+async def _record_changes(*names: str):
+    """Make fills of `names` that started before now skip their store.
+
+    With replicas, fills that read one of them also skip it until the longest tolerated lag has passed,
+    since the replica may not have seen the change yet.
+    """
+    if not names:
+        return
+    sequence = await redis_connection.incr(CHANGE_SEQUENCE_KEY)
+    lag = fastapi_config.REPLICA_MAX_LAG_SECONDS + fastapi_config.REPLICA_CHECK_INTERVAL
+    async with redis_connection.pipeline(transaction=False) as pipe:
+        for name in names:
+            changed, changing = _change_keys(name)
+            pipe.set(changed, sequence, ex=CHANGE_MARKER_TTL)
+            if fastapi_config.SQLALCHEMY_REPLICA_URIS:
+                pipe.set(changing, 1, px=int(lag * 1000))
+        await pipe.execute()
+
+
+def _store_unchanged(pipe, key: str, payload: str, ttl: int, names, since: int, from_replica: bool):
+    keys = [key] + [change_key for name in names for change_key in _change_keys(name)]
+    pipe.eval(STORE_UNCHANGED_SCRIPT, len(keys), *keys, payload, ttl, since, int(from_replica))
+
+
+class EntityCache:
+    """Serialized entities keyed by id, written through by the models on save and delete."""
+
+    def __init__(self, entity: str, ttl: int = ENTITY_TTL):
+        self.entity = entity
+        self.ttl = ttl
+
+    def _key(self, entity_id: int) -> str:
+        return f"entity:v{ENTITY_VERSION}:{self.entity}:{entity_id}"
+
+    async def get(self, entity_id: int) -> dict | None:
+        cache = await redis_connection.get(self._key(entity_id))
+        return json.loads(cache) if cache else None
+
+    async def get_many(self, entity_ids: list[int]) -> dict:
+        if not entity_ids:
+            return {}
+        values = await redis_connection.mget([self._key(entity_id) for entity_id in entity_ids])
+        return {entity_id: json.loads(value) for entity_id, value in zip(entity_ids, values) if value}
+
+    def _name(self, entity_id: int) -> str:
+        return f"entity:{self.entity}:{entity_id}"
+
+    async def set(self, entity_id: int, value: dict):
+        """Write through an entity just saved; fills that read it before the save won't overwrite it."""
+        await _record_changes(self._name(entity_id))
+        await redis_connection.set(self._key(entity_id), json.dumps(value), ex=self.ttl)
+
+    async def fill_many(self, values: dict, since: int, session):
+        """Cache entities read from `session` unless they changed after `change_sequence()` returned `since`."""
+        if not values:
+            return
+        async with redis_connection.pipeline(transaction=False) as pipe:
+            for entity_id, value in values.items():
+                _store_unchanged(
+                    pipe, self._key(entity_id), json.dumps(value), self.ttl, [self._name(entity_id)], since,
+                    _reads_replica(session),
+                )
+            await pipe.execute()
+
+    async def delete(self, *entity_ids: int):
+        if entity_ids:
+            await _record_changes(*[self._name(entity_id) for entity_id in entity_ids])
+            await redis_connection.delete(*[self._key(entity_id) for entity_id in entity_ids])
+
 
-def cache_it(key_name: str):
+book_cache = EntityCache("book")
+author_cache = EntityCache("author")
+
+
+def _tag_key(tag: str) -> str:
+    return f"cache:tag:{tag}"
+
+
+def _namespace_key(namespace: str) -> str:
+    return f"cache:ns:{namespace}"
+
+
+async def _store(key: str, payload: str, ttl: int, set_keys: list[str], set_ttl: int | None = None):
+    """Write an entry and register it in the tag and namespace sets that invalidate it."""
+    async with redis_connection.pipeline(transaction=False) as pipe:
+        pipe.set(key, payload, ex=ttl)
+        for set_key in set_keys:
+            pipe.sadd(set_key, key)
+            pipe.expire(set_key, set_ttl or ttl)
+        await pipe.execute()
+
+
+def graphql_type_tag(type_name: str) -> str:
+    """Tag of cached GraphQL results that include objects of the given GraphQL type."""
+    return f"graphql:{type_name}"
+
+
+async def get_tagged(key: str):
+    cache = await redis_connection.get(key)
+    return json.loads(cache) if cache else None
+
+
+async def set_tagged(key: str, value, ttl: int, tags, tags_ttl: int | None = None):
+    """Cache `value` until `ttl` expires or `invalidate_tags` is called with one of `tags`.
+
+    `tags_ttl` must cover the longest `ttl` stored under the same tags, or the tag sets expire first.
+    """
+    await _store(key, json.dumps(value), ttl, [_tag_key(tag) for tag in set(tags)], tags_ttl)
+
+
+async def _acquire_lock(key: str, lease: float) -> str | None:
+    token = uuid.uuid4().hex
+    if await redis_connection.set(f"lock:{key}", token, nx=True, px=int(lease * 1000)):
+        return token
+    return None
+
+
+async def _release_lock(key: str, token: str):
+    await redis_connection.eval(RELEASE_LOCK_SCRIPT, 1, f"lock:{key}", token)
+
+
+async def _read_entry(key: str, hard_ttl: int) -> dict | None:
+    async with redis_connection.pipeline(transaction=False) as pipe:
+        cache, ttl_ms = await pipe.get(key).pttl(key).execute()
+    if not cache:
+        return None
+    entry = json.loads(cache)
+    # The local copy must not outlive the Redis entry, which may have been written long ago
+    if ttl_ms > 0:
+        local_cache.set(key, entry, len(cache), min(hard_ttl, ttl_ms / 1000))
+    return entry
+
+
+def cache_it(
+    namespace: str,
+    tags=None,
+    soft_ttl: int = CACHE_SOFT_TTL,
+    hard_ttl: int = CACHE_HARD_TTL,
+    lock_lease: float = CACHE_LOCK_LEASE,
+):
+    """Cache the endpoint result per namespace, query parameters and caller scope.
+
+    `tags(result, params)` returns the tags ("book:1", "author:3", ...) the entry depends on,
+    so `invalidate_tags` can evict only the entries that mention a changed entity.
+
+    Entries are fresh for `soft_ttl` seconds and kept for `hard_ttl`. A stale entry is served while a
+    single background task refreshes it; on a miss only the holder of a Redis lock (leased for `lock_lease`
+    seconds) recomputes, and concurrent requests wait for its result instead of hitting the database.
+    """
     def Inner(func):
-        @wraps(func)
-        async def wrapper(*args, **kwargs):
-            cache = await redis_connection.get(key_name)
-            if cache:
-                return json.loads(cache)
+        async def fill(key: str, args: tuple, kwargs: dict):
+            since = await change_sequence()
             result = await func(*args, **kwargs)
-            await redis_connection.set(key_name, json.dumps(result))
-            await redis_connection.expire(key_name, 300)
+            entry = {"value": result, "fresh_until": time.time() + soft_ttl}
+            payload = json.dumps(entry)
+            entry_tags = set(tags(result, _params(kwargs))) if tags else set()
+            # Registered before the entry is written: an invalidation either sees the key in its sets or
+            # records its change before the write, which is then skipped
+            async with redis_connection.pipeline(transaction=False) as pipe:
+                for set_key in [_namespace_key(namespace)] + [_tag_key(tag) for tag in entry_tags]:
+                    pipe.sadd(set_key, key)
+                    pipe.expire(set_key, hard_ttl)
+                _store_unchanged(
+                    pipe, key, payload, hard_ttl, [f"ns:{namespace}"] + [f"tag:{tag}" for tag in entry_tags], since,
+                    _reads_replica(kwargs.get("session")),
+                )
+                stored = (await pipe.execute())[-1]
+            if stored:
+                local_cache.set(key, entry, len(payload), hard_ttl)
             return result
+
+        async def refresh(key: str, token: str, args: tuple, kwargs: dict):
+            # The request's session is closed once the response is sent, so refresh on a session of its own
+            try:
+                if "session" in kwargs:
+                    async with AsyncSession(kwargs["session"].bind, expire_on_commit=False) as session:
+                        await fill(key, args, {**kwargs, "session": session})
+                else:
+                    await fill(key, args, kwargs)
+            except Exception:
+                logger.exception("Background refresh of %s failed", key)
+            finally:
+                await _release_lock(key, token)
+
+        @wraps(func)
+        async def wrapper(*args, **kwargs):
+            key = cache_key(namespace, kwargs)
+            entry = local_cache.get(key)
+            if entry is None or entry["fresh_until"] <= time.time():
+                entry = await _read_entry(key, hard_ttl)
+
+            if entry is not None:
+                if entry["fresh_until"] <= time.time():
+                    token = await _acquire_lock(key, lock_lease)
+                    if token:
+                        _spawn(refresh(key, token, args, kwargs))
+                return entry["value"]
+
+            token = await _acquire_lock(key, lock_lease)
+            if not token:
+                deadline = time.monotonic() + lock_lease
+                while time.monotonic() < deadline:
+                    await asyncio.sleep(CACHE_LOCK_POLL_INTERVAL)
+                    entry = await _read_entry(key, hard_ttl)
+                    if entry is not None:
+                        return entry["value"]
+                    if not await redis_connection.exists(f"lock:{key}"):
+                        break
+                # The lock holder died, is too slow or skipped its store after an invalidation; compute without it
+                return await fill(key, args, kwargs)
+            try:
+                return await fill(key, args, kwargs)
+            finally:
+                await _release_lock(key, token)
         return wrapper
     return Inner
 
 
-def drop_cache(key_name: str):
+async def _drop_members(*set_keys: str):
+    if not set_keys:
+        return
+    keys = await redis_connection.sunion(set_keys)
+    await redis_connection.delete(*keys, *set_keys)
+    await invalidate_local(*[key.decode() for key in keys])
+
+
+async def invalidate_local(*keys: str):
+    """Drop keys from the local tier of this worker and, through pub/sub, of every other worker."""
+    if not keys:
+        return
+    for key in keys:
+        local_cache.discard(key)
+    await redis_connection.publish(INVALIDATION_CHANNEL, json.dumps(keys))
+
+
+async def invalidate_tags(*tags: str):
+    await _record_changes(*[f"tag:{tag}" for tag in set(tags)])
+    await _drop_members(*[_tag_key(tag) for tag in set(tags)])
+
+
+async def invalidate_namespace(namespace: str):
+    await _record_changes(f"ns:{namespace}")
+    await _drop_members(_namespace_key(namespace))
+
+
+def drop_cache(namespace: str):
     def Inner(func):
         @wraps(func)
         async def wrapper(*args, **kwargs):
-            cache = await redis_connection.get(key_name)
-            if cache:
-                await redis_connection.delete(key_name)
-            return await func(*args, **kwargs)
+            result = await func(*args, **kwargs)
+            await invalidate_namespace(namespace)
+            return result
         return wrapper
     return Inner
+
+
+async def listen_for_invalidations():
+    """Drop local entries that another worker (or node) invalidated in Redis.
+
+    Messages may be missed while the subscription is down, so the local tier is cleared on every (re)connect.
+    """
+    while True:
+        try:
+            async with redis_connection.pubsub() as pubsub:
+                await pubsub.subscribe(INVALIDATION_CHANNEL)
+                local_cache.clear()
+                async for message in pubsub.listen():
+                    if message["type"] != "message":
+                        continue
+                    for key in json.loads(message["data"]):
+                        local_cache.discard(key)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("Cache invalidation subscription failed, reconnecting")
+            local_cache.clear()
+            await asyncio.sleep(1)
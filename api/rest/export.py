@@ -0,0 +1,69 @@
+"""Streaming responses for catalog exports, written while the rows are still being read."""
+import csv
+import io
+import json
+from typing import AsyncIterator, Callable
+
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession
+
+
+MEDIA_TYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+CHUNK_SIZE = 64 * 1024  # characters buffered before a chunk is sent
+
+
+async def _rows(bind: AsyncEngine, read: Callable[[AsyncSession], AsyncIterator[dict]]):
+    # Sessions from yield dependencies may be closed before the response is sent (FastAPI 0.106+),
+    # so the rows are read on a session that lives and dies with the stream
+    async with AsyncSession(bind, expire_on_commit=False) as session:
+        async for row in read(session):
+            yield row
+
+
+async def _ndjson_lines(rows: AsyncIterator[dict]):
+    async for row in rows:
+        yield json.dumps(row) + "\n"
+
+
+async def _csv_lines(rows: AsyncIterator[dict], columns: dict[str, Callable[[dict], object]]):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    async for row in rows:
+        writer.writerow([value(row) for value in columns.values()])
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    yield buffer.getvalue()
+
+
+async def _chunks(lines: AsyncIterator[str]):
+    chunk = []
+    size = 0
+    async for line in lines:
+        chunk.append(line)
+        size += len(line)
+        if size >= CHUNK_SIZE:
+            yield "".join(chunk)
+            chunk, size = [], 0
+    if chunk:
+        yield "".join(chunk)
+
+
+def export_response(
+    bind: AsyncEngine,
+    read: Callable[[AsyncSession], AsyncIterator[dict]],
+    file_format: str,
+    name: str,
+    columns: dict[str, Callable[[dict], object]],
+) -> StreamingResponse:
+    """Stream the rows `read` yields from a session on `bind` as NDJSON, or as CSV with one column per entry
+    of `columns` (header to value of a row).
+    """
+    rows = _rows(bind, read)
+    lines = _csv_lines(rows, columns) if file_format == "csv" else _ndjson_lines(rows)
+    return StreamingResponse(
+        _chunks(lines),
+        media_type=MEDIA_TYPES[file_format],
+        headers={"Content-Disposition": f'attachment; filename="{name}.{file_format}"'},
+    )
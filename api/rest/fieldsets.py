@@ -0,0 +1,32 @@
+"""Sparse fieldsets: the `fields` and `expand` query parameters of the read endpoints."""
+from typing import NamedTuple
+
+from fastapi import HTTPException
+
+
+class Fieldset(NamedTuple):
+    fields: list[str]
+    expand: list[str]
+
+
+def _names(value: str, allowed: tuple, parameter: str) -> list[str]:
+    names = list(dict.fromkeys(name.strip() for name in value.split(",") if name.strip()))
+    unknown = [name for name in names if name not in allowed]
+    if unknown:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown {parameter}: {', '.join(unknown)} (expected any of {', '.join(allowed)})",
+        )
+    return names
+
+
+def parse_fieldset(fields: str | None, expand: str | None, allowed: tuple, relations: tuple) -> Fieldset | None:
+    """Check `fields` against `allowed` and `expand` against `relations`; None when neither is given.
+
+    Without `fields` every field is returned, and the id always is. Relations are only embedded when
+    named in `expand`, unless neither parameter is given, which keeps the full representation.
+    """
+    if fields is None and expand is None:
+        return None
+    names = _names(fields, allowed, "fields") if fields is not None else list(allowed)
+    return Fieldset(list(dict.fromkeys(["id", *names])), _names(expand or "", relations, "expand"))
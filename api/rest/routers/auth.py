@@ -5,9 +5,12 @@ from fastapi.security import OAuth2PasswordRequestForm
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from api.database.database import get_session
+from api.hashing import HashingQueueFull
 from api.models import UserModel
 from api.rest.schemas import auth, user
-from api.security import create_access_token, create_refresh_token
+from api.security import (
+    RefreshTokenError, create_access_token, create_refresh_token, revoke_refresh_token, rotate_refresh_token
+)
 from api.tasks.tasks import send_welcome_email
 
 
@@ -31,15 +34,37 @@ async def login(
     if not db_user:
         raise HTTPException(status_code=401, detail="Authentification failed! Check entered values")
 
-    if UserModel.verify_hash(password, db_user.hashed_password):
+    try:
+        password_matches = await UserModel.verify_hash_async(password, db_user.hashed_password)
+    except HashingQueueFull as e:
+        raise HTTPException(status_code=503, detail=str(e)) from e
+
+    if password_matches:
         return {
             "access_token": create_access_token(subject=db_user.login, user=db_user),
-            "refresh_token": create_refresh_token(subject=db_user.login, user=db_user),
+            "refresh_token": await create_refresh_token(subject=db_user.login, user=db_user),
         }
     else:
         raise HTTPException(status_code=401, detail="You've entered wrong password")
 
 
+@router.post("/refresh", response_model=auth.Token)
+async def refresh(token_data: auth.RefreshRequest):
+    try:
+        return await rotate_refresh_token(token_data.refresh_token)
+    except RefreshTokenError as e:
+        raise HTTPException(status_code=401, detail=str(e), headers={"WWW-Authenticate": "Bearer"})
+
+
+@router.post("/logout")
+async def logout(token_data: auth.RefreshRequest):
+    try:
+        await revoke_refresh_token(token_data.refresh_token)
+    except RefreshTokenError as e:
+        raise HTTPException(status_code=401, detail=str(e), headers={"WWW-Authenticate": "Bearer"})
+    return {"detail": "Successfully logged out"}
+
+
 @router.post("/signup", status_code=201)
 async def signup(
     user_data: user.UserCreate,
@@ -54,19 +79,13 @@ async def signup(
         if existing_user:
             raise HTTPException(status_code=409, detail="User already exists. Please Log in")
 
-        new_user = UserModel(
-            name=name,
-            login=login,
-            hashed_password=UserModel.generate_hash(password),
-            email=email,
-        )
-        await new_user.save_to_db(session)
+        new_user = await UserModel.create(session, name, login, await UserModel.generate_hash_async(password), email)
 
         if email:
             try:
                 send_welcome_email.delay(email_to=email, body={"name": name})
             except Exception as e:
-                await UserModel.delete_by_id(session, new_user.id)
+                await UserModel.delete_by_id(session, new_user["id"])
                 raise HTTPException(
                     status_code=500, detail="Failed to send welcome email. User registration rolled back."
                 ) from e
@@ -75,6 +94,8 @@ async def signup(
 
     except HTTPException:
         raise
+    except HashingQueueFull as e:
+        raise HTTPException(status_code=503, detail=str(e)) from e
     except Exception as e:
         raise HTTPException(
             status_code=500, detail="Failed to create user. Database access error."
@@ -1,12 +1,24 @@
-from fastapi import APIRouter, HTTPException, Depends
+from functools import partial
+from typing import Literal
+
+from fastapi import APIRouter, HTTPException, Depends, Query
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from api import fastapi_config
 from api.database.database import get_session
-from api.dependencies import get_current_user
-from api.models import BookModel, AuthorModel, UserModel
-from api.rest.schemas.author import Author, AuthorCreate, AuthorUpdate
+from api.database.replicas import get_read_session
+from api.database.pagination import PaginationError
+from api.dependencies import get_token_data
+from api.models import BookModel, AuthorModel
+from api.rest.schemas.author import Author, AuthorBulkUpdate, AuthorCreate, AuthorFields, AuthorUpdate
+from api.rest.schemas.book import BookFields
+from api.rest.schemas.bulk import Batch, BulkDelete, BulkDeleted
+from api.rest.export import export_response
+from api.rest.fieldsets import parse_fieldset
+from api.rest.schemas.auth import TokenData
+from api.rest.schemas.page import Page
 from api.security import admin_required
-from api.redis import cache_it, drop_cache
+from api.redis import cache_it, drop_cache, invalidate_tags
 
 
 router = APIRouter(
@@ -15,80 +27,222 @@ router = APIRouter(
 )
 
 
-@router.get("/", response_model=list[Author])
-@cache_it("authors")
+def author_tags(page: dict, params: dict):
+    if params.get("name") or params.get("sort", "id").lstrip("-") == "name":
+        yield "authors:name"
+    for author in page["items"]:
+        yield f"author:{author['id']}"
+        yield from (f"book:{book['id']}" for book in author.get("books", []))
+
+
+@router.get("/", response_model=Page[AuthorFields], response_model_exclude_unset=True)
+@cache_it("authors", tags=author_tags)
 async def get_authors(
     name: str | None = None,
-    current_user: UserModel = Depends(get_current_user),
-    session: AsyncSession = Depends(get_session),
+    limit: int = Query(fastapi_config.PAGE_SIZE_DEFAULT, ge=1, le=fastapi_config.PAGE_SIZE_MAX),
+    after: str | None = None,
+    sort: str = "id",
+    fields: str | None = None,
+    expand: str | None = None,
+    current_user: TokenData = Depends(get_token_data),
+    session: AsyncSession = Depends(get_read_session),
+):
+    fieldset = parse_fieldset(fields, expand, AuthorModel.field_names, ("books",))
+    name = name.capitalize() if name else None
+    try:
+        if fieldset is None:
+            authors, next_cursor = await AuthorModel.get_page_dicts(session, limit, after, sort, name=name)
+        else:
+            authors, next_cursor = await AuthorModel.get_page_fields(
+                session, limit, after, sort, fieldset.fields, "books" in fieldset.expand, name=name
+            )
+    except PaginationError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"items": authors, "next_cursor": next_cursor}
+
+
+@router.get("/export")
+async def export_authors(
+    name: str | None = None,
+    file_format: Literal["ndjson", "csv"] = Query("ndjson", alias="format"),
+    current_user: TokenData = Depends(get_token_data),
+    session: AsyncSession = Depends(get_read_session),
 ):
-    if name:
-        authors = await AuthorModel.get_by_name(session, name.capitalize())
-        return [author.to_dict() for author in authors]
-    authors = await AuthorModel.return_all(session)
-    return [author.to_dict() for author in authors]
+    """All active authors, streamed as they are read from the database `session` is bound to."""
+    authors = partial(
+        AuthorModel.stream_dicts, batch_size=fastapi_config.EXPORT_BATCH_SIZE, name=name.capitalize() if name else None
+    )
+    return export_response(session.bind, authors, file_format, "authors", {
+        "id": lambda author: author["id"],
+        "name": lambda author: author["name"],
+        "books": lambda author: "|".join(book["title"] for book in author["books"]),
+    })
 
 
-@router.get("/{author_id}", response_model=Author)
+@router.get("/{author_id}", response_model=AuthorFields, response_model_exclude_unset=True)
 async def get_author(
     author_id: int,
-    current_user: UserModel = Depends(get_current_user),
-    session: AsyncSession = Depends(get_session),
+    fields: str | None = None,
+    expand: str | None = None,
+    current_user: TokenData = Depends(get_token_data),
+    session: AsyncSession = Depends(get_read_session),
 ):
-    author = await AuthorModel.get_by_id(session, author_id)
+    fieldset = parse_fieldset(fields, expand, AuthorModel.field_names, ("books",))
+    if fieldset is None:
+        author = await AuthorModel.get_dict(session, author_id)
+    else:
+        author = await AuthorModel.get_fields(session, author_id, fieldset.fields, "books" in fieldset.expand)
     if not author:
         raise HTTPException(status_code=404, detail="Author not found")
-    return author.to_dict()
+    return author
+
+
+@router.get("/{author_id}/books", response_model=Page[BookFields], response_model_exclude_unset=True)
+async def get_author_books(
+    author_id: int,
+    limit: int = Query(fastapi_config.PAGE_SIZE_DEFAULT, ge=1, le=fastapi_config.PAGE_SIZE_MAX),
+    after: str | None = None,
+    sort: str = "id",
+    fields: str | None = None,
+    expand: str | None = None,
+    current_user: TokenData = Depends(get_token_data),
+    session: AsyncSession = Depends(get_read_session),
+):
+    """Every book of an author, a page at a time; authors only embed the first RELATED_ITEMS_MAX."""
+    fieldset = parse_fieldset(fields, expand, BookModel.field_names, ("authors",))
+    try:
+        if fieldset is None:
+            books, next_cursor = await BookModel.get_page_dicts(session, limit, after, sort, author_id=author_id)
+        else:
+            books, next_cursor = await BookModel.get_page_fields(
+                session, limit, after, sort, fieldset.fields, "authors" in fieldset.expand, author_id=author_id
+            )
+    except PaginationError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if not books and not await AuthorModel.active_ids(session, [author_id]):
+        raise HTTPException(status_code=404, detail="Author not found")
+    return {"items": books, "next_cursor": next_cursor}
 
 
 @router.post("/", status_code=201, response_model=Author)
 @admin_required
+@drop_cache("search")
 @drop_cache("authors")
 async def create_author(
     author_data: AuthorCreate,
-    current_user: UserModel = Depends(get_current_user),
+    current_user: TokenData = Depends(get_token_data),
     session: AsyncSession = Depends(get_session),
 ):
     if not author_data or not author_data.name:
         raise HTTPException(status_code=400, detail="Please fill in all information about the author")
-    new_author = AuthorModel(name=author_data.name)
-    await new_author.save_to_db(session)
-    return (await AuthorModel.get_by_id(session, new_author.id)).to_dict()
+    return await AuthorModel.create(session, author_data.name)
 
 
-@router.put("/{author_id}", response_model=Author)
+@router.post("/bulk", status_code=201, response_model=list[Author])
 @admin_required
+@drop_cache("search")
 @drop_cache("authors")
-@drop_cache("books")
+async def create_authors(
+    authors_data: Batch(AuthorCreate),
+    current_user: TokenData = Depends(get_token_data),
+    session: AsyncSession = Depends(get_session),
+):
+    if not all(author_data.name for author_data in authors_data):
+        raise HTTPException(status_code=400, detail="Please fill in all information about the authors")
+
+    books = await BookModel.active_ids(session, [i for author_data in authors_data for i in author_data.book_ids or []])
+    ids = await AuthorModel.bulk_create(session, [
+        {
+            "name": author_data.name,
+            "book_ids": [book_id for book_id in author_data.book_ids or [] if book_id in books],
+        }
+        for author_data in authors_data
+    ])
+    await invalidate_tags(*[f"book:{book_id}" for book_id in books])
+    return await AuthorModel.get_dicts(session, ids)
+
+
+@router.patch("/bulk", response_model=list[Author])
+@admin_required
+@drop_cache("search")
+async def update_authors(
+    authors_data: Batch(AuthorBulkUpdate),
+    current_user: TokenData = Depends(get_token_data),
+    session: AsyncSession = Depends(get_session),
+):
+    ids = [author_data.id for author_data in authors_data]
+    if len(set(ids)) != len(ids):
+        raise HTTPException(status_code=400, detail="Each author can only be updated once per request")
+
+    books = await BookModel.active_ids(session, [i for author_data in authors_data for i in author_data.book_ids or []])
+    missing = await AuthorModel.bulk_update(session, [
+        {
+            "id": author_data.id,
+            "name": author_data.name or None,
+            "book_ids": [book_id for book_id in author_data.book_ids or [] if book_id in books],
+        }
+        for author_data in authors_data
+    ])
+    if missing:
+        raise HTTPException(status_code=404, detail=f"Authors not found: {missing}")
+
+    tags = [f"author:{author_id}" for author_id in ids] + [f"book:{book_id}" for book_id in books]
+    if any(author_data.name for author_data in authors_data):
+        tags.append("authors:name")
+    await invalidate_tags(*tags)
+    return await AuthorModel.get_dicts(session, ids)
+
+
+@router.delete("/bulk", response_model=BulkDeleted)
+@admin_required
+@drop_cache("search")
+async def delete_authors(
+    delete_data: BulkDelete,
+    current_user: TokenData = Depends(get_token_data),
+    session: AsyncSession = Depends(get_session),
+):
+    ids = list(dict.fromkeys(delete_data.ids))
+    missing = await AuthorModel.bulk_delete(session, ids)
+    if missing:
+        raise HTTPException(status_code=404, detail=f"Authors not found: {missing}")
+    await invalidate_tags(*[f"author:{author_id}" for author_id in ids])
+    return {"detail": "Authors have been deleted", "ids": ids}
+
+
+@router.put("/{author_id}", response_model=Author)
+@admin_required
+@drop_cache("search")
 async def update_author(
     author_id: int,
     author_data: AuthorUpdate,
-    current_user: UserModel = Depends(get_current_user),
+    current_user: TokenData = Depends(get_token_data),
     session: AsyncSession = Depends(get_session),
 ):
-    author = await AuthorModel.get_by_id(session, author_id)
-    if not author:
-        raise HTTPException(status_code=404, detail="Author not found")
     if not author_data.name and not author_data.book_ids:
         raise HTTPException(status_code=400, detail="Please fill in some information about the author")
 
-    author.name = author_data.name or author.name
-    author.books = await BookModel.get_by_ids(session, author_data.book_ids) if author_data.book_ids else author.books
-    await author.save_to_db(session)
-    return (await AuthorModel.get_by_id(session, author.id)).to_dict()
+    author = await AuthorModel.update(session, author_id, author_data.name, author_data.book_ids)
+    if not author:
+        raise HTTPException(status_code=404, detail="Author not found")
+    # Entries that already mention the author, plus lists of the books it was just linked to
+    tags = [f"author:{author_id}"] + [f"book:{book_id}" for book_id in author_data.book_ids or []]
+    if author_data.name:
+        tags.append("authors:name")
+    await invalidate_tags(*tags)
+    return author
 
 
 @router.delete("/{author_id}")
 @admin_required
-@drop_cache("authors")
-@drop_cache("books")
+@drop_cache("search")
 async def delete_author(
     author_id: int,
-    current_user: UserModel = Depends(get_current_user),
+    current_user: TokenData = Depends(get_token_data),
     session: AsyncSession = Depends(get_session),
 ):
     status_code = await AuthorModel.delete_by_id(session, author_id)
     if status_code == 200:
+        await invalidate_tags(f"author:{author_id}")
         return {"detail": "Author has been deleted"}
     elif status_code == 404:
         raise HTTPException(status_code=404, detail="Author not found")
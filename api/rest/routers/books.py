@@ -1,13 +1,33 @@
-from fastapi import APIRouter, HTTPException, Depends
+import os
+import shutil
+import uuid
+from functools import partial
+from typing import Literal
+
+from celery.result import AsyncResult
+from fastapi import APIRouter, HTTPException, Depends, Query, UploadFile
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from api import fastapi_config
 from api.database.database import get_session
-from api.dependencies import get_current_user
-from api.models import BookModel, AuthorModel, UserModel
-from api.rest.schemas.book import Book, BookCreate, BookUpdate
+from api.database.replicas import get_read_session
+from api.database.pagination import PaginationError
+from api.dependencies import get_current_user, get_token_data
+from api.models import BookModel, AuthorModel
+from api.rest.schemas.author import AuthorFields
+from api.rest.schemas.book import Book, BookBulkUpdate, BookCreate, BookFields, BookUpdate
+from api.rest.schemas.bulk import Batch, BulkDelete, BulkDeleted
+from api.rest.schemas.imports import ImportJob
+from api.rest.export import export_response
+from api.rest.fieldsets import parse_fieldset
+from api.rest.schemas.auth import TokenData
+from api.rest.schemas.page import Page
+from api.rest.schemas.user import User
 from api.security import admin_required
-from api.redis import cache_it, drop_cache
-from api.tasks.tasks import generate_pdf
+from api.redis import cache_it, drop_cache, invalidate_tags
+from api.tasks.catalog_import import FORMATS
+from api.tasks.tasks import celery_app, generate_pdf, import_catalog
 from api.email_settings import send_catalog
 
 
@@ -17,93 +37,315 @@ router = APIRouter(
 )
 
 
-@router.get("/", response_model=list[Book])
-@cache_it("books")
+def book_tags(page: dict, params: dict):
+    if params.get("title") or params.get("sort", "id").lstrip("-") == "title":
+        yield "books:title"
+    for book in page["items"]:
+        yield f"book:{book['id']}"
+        yield from (f"author:{author['id']}" for author in book.get("authors", []))
+
+
+@router.get("/", response_model=Page[BookFields], response_model_exclude_unset=True)
+@cache_it("books", tags=book_tags)
 async def get_books(
     title: str | None = None,
-    current_user: UserModel = Depends(get_current_user),
-    session: AsyncSession = Depends(get_session),
+    limit: int = Query(fastapi_config.PAGE_SIZE_DEFAULT, ge=1, le=fastapi_config.PAGE_SIZE_MAX),
+    after: str | None = None,
+    sort: str = "id",
+    fields: str | None = None,
+    expand: str | None = None,
+    current_user: TokenData = Depends(get_token_data),
+    session: AsyncSession = Depends(get_read_session),
 ):
-    if title:
-        books = await BookModel.get_by_title(session, title)
-        return [book.to_dict() for book in books]
-    books = await BookModel.return_all(session)
-    return [book.to_dict() for book in books]
+    fieldset = parse_fieldset(fields, expand, BookModel.field_names, ("authors",))
+    try:
+        if fieldset is None:
+            books, next_cursor = await BookModel.get_page_dicts(session, limit, after, sort, title=title)
+        else:
+            books, next_cursor = await BookModel.get_page_fields(
+                session, limit, after, sort, fieldset.fields, "authors" in fieldset.expand, title=title
+            )
+    except PaginationError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"items": books, "next_cursor": next_cursor}
 
 
-@router.get("/{book_id}", response_model=Book)
+@router.get("/export")
+async def export_books(
+    title: str | None = None,
+    file_format: Literal["ndjson", "csv"] = Query("ndjson", alias="format"),
+    current_user: TokenData = Depends(get_token_data),
+    session: AsyncSession = Depends(get_read_session),
+):
+    """All active books, streamed as they are read from the database `session` is bound to."""
+    books = partial(BookModel.stream_dicts, batch_size=fastapi_config.EXPORT_BATCH_SIZE, title=title)
+    return export_response(session.bind, books, file_format, "books", {
+        "id": lambda book: book["id"],
+        "title": lambda book: book["title"],
+        "description": lambda book: book["description"],
+        # The format accepted by POST /books/import
+        "authors": lambda book: "|".join(author["name"] for author in book["authors"]),
+    })
+
+
+@router.get("/{book_id}", response_model=BookFields, response_model_exclude_unset=True)
 async def get_book(
     book_id: int,
-    current_user: UserModel = Depends(get_current_user),
-    session: AsyncSession = Depends(get_session),
+    fields: str | None = None,
+    expand: str | None = None,
+    current_user: TokenData = Depends(get_token_data),
+    session: AsyncSession = Depends(get_read_session),
 ):
-    book = await BookModel.get_by_id(session, book_id)
+    fieldset = parse_fieldset(fields, expand, BookModel.field_names, ("authors",))
+    if fieldset is None:
+        book = await BookModel.get_dict(session, book_id)
+    else:
+        book = await BookModel.get_fields(session, book_id, fieldset.fields, "authors" in fieldset.expand)
     if not book:
         raise HTTPException(status_code=404, detail="Book not found")
-    return book.to_dict()
+    return book
+
+
+@router.get("/{book_id}/authors", response_model=Page[AuthorFields], response_model_exclude_unset=True)
+async def get_book_authors(
+    book_id: int,
+    limit: int = Query(fastapi_config.PAGE_SIZE_DEFAULT, ge=1, le=fastapi_config.PAGE_SIZE_MAX),
+    after: str | None = None,
+    sort: str = "id",
+    fields: str | None = None,
+    expand: str | None = None,
+    current_user: TokenData = Depends(get_token_data),
+    session: AsyncSession = Depends(get_read_session),
+):
+    """Every author of a book, a page at a time; books only embed the first RELATED_ITEMS_MAX."""
+    fieldset = parse_fieldset(fields, expand, AuthorModel.field_names, ("books",))
+    try:
+        if fieldset is None:
+            authors, next_cursor = await AuthorModel.get_page_dicts(session, limit, after, sort, book_id=book_id)
+        else:
+            authors, next_cursor = await AuthorModel.get_page_fields(
+                session, limit, after, sort, fieldset.fields, "books" in fieldset.expand, book_id=book_id
+            )
+    except PaginationError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if not authors and not await BookModel.active_ids(session, [book_id]):
+        raise HTTPException(status_code=404, detail="Book not found")
+    return {"items": authors, "next_cursor": next_cursor}
 
 
 @router.post("/", status_code=201, response_model=Book)
 @admin_required
+@drop_cache("search")
 @drop_cache("books")
-@drop_cache("authors")
 async def create_book(
     book_data: BookCreate,
-    current_user: UserModel = Depends(get_current_user),
+    current_user: TokenData = Depends(get_token_data),
     session: AsyncSession = Depends(get_session),
 ):
     if not book_data or not book_data.title:
         raise HTTPException(status_code=400, detail="Please fill in all information about the book")
 
-    authors = await AuthorModel.get_by_ids(session, book_data.author_ids) if book_data.author_ids else []
-    new_book = BookModel(title=book_data.title, authors=authors, description=book_data.description)
-    await new_book.save_to_db(session)
-    return (await BookModel.get_by_id(session, new_book.id)).to_dict()
+    new_book = await BookModel.create(session, book_data.title, book_data.description, book_data.author_ids)
+    await invalidate_tags(*[f"author:{author['id']}" for author in new_book["authors"]])
+    return new_book
 
 
-@router.put("/{book_id}", response_model=Book)
+@router.post("/bulk", status_code=201, response_model=list[Book])
 @admin_required
+@drop_cache("search")
 @drop_cache("books")
-@drop_cache("authors")
+async def create_books(
+    books_data: Batch(BookCreate),
+    current_user: TokenData = Depends(get_token_data),
+    session: AsyncSession = Depends(get_session),
+):
+    if not all(book_data.title for book_data in books_data):
+        raise HTTPException(status_code=400, detail="Please fill in all information about the books")
+
+    authors = await AuthorModel.active_ids(session, [i for book_data in books_data for i in book_data.author_ids or []])
+    ids = await BookModel.bulk_create(session, [
+        {
+            "title": book_data.title,
+            "description": book_data.description,
+            "author_ids": [author_id for author_id in book_data.author_ids or [] if author_id in authors],
+        }
+        for book_data in books_data
+    ])
+    await invalidate_tags(*[f"author:{author_id}" for author_id in authors])
+    return await BookModel.get_dicts(session, ids)
+
+
+@router.patch("/bulk", response_model=list[Book])
+@admin_required
+@drop_cache("search")
+async def update_books(
+    books_data: Batch(BookBulkUpdate),
+    current_user: TokenData = Depends(get_token_data),
+    session: AsyncSession = Depends(get_session),
+):
+    ids = [book_data.id for book_data in books_data]
+    if len(set(ids)) != len(ids):
+        raise HTTPException(status_code=400, detail="Each book can only be updated once per request")
+
+    authors = await AuthorModel.active_ids(session, [i for book_data in books_data for i in book_data.author_ids or []])
+    missing = await BookModel.bulk_update(session, [
+        {
+            "id": book_data.id,
+            "title": book_data.title or None,
+            "description": book_data.description or None,
+            "author_ids": [author_id for author_id in book_data.author_ids or [] if author_id in authors],
+        }
+        for book_data in books_data
+    ])
+    if missing:
+        raise HTTPException(status_code=404, detail=f"Books not found: {missing}")
+
+    tags = [f"book:{book_id}" for book_id in ids] + [f"author:{author_id}" for author_id in authors]
+    if any(book_data.title for book_data in books_data):
+        tags.append("books:title")
+    await invalidate_tags(*tags)
+    return await BookModel.get_dicts(session, ids)
+
+
+@router.delete("/bulk", response_model=BulkDeleted)
+@admin_required
+@drop_cache("search")
+async def delete_books(
+    delete_data: BulkDelete,
+    current_user: TokenData = Depends(get_token_data),
+    session: AsyncSession = Depends(get_session),
+):
+    ids = list(dict.fromkeys(delete_data.ids))
+    missing = await BookModel.bulk_delete(session, ids)
+    if missing:
+        raise HTTPException(status_code=404, detail=f"Books not found: {missing}")
+    await invalidate_tags(*[f"book:{book_id}" for book_id in ids])
+    return {"detail": "Books have been deleted", "ids": ids}
+
+
+def _import_format(file: UploadFile, file_format: str | None) -> str:
+    if not file_format:
+        extension = os.path.splitext(file.filename or "")[1].lower().lstrip(".")
+        file_format = {"jsonl": "ndjson", "json": "ndjson"}.get(extension, extension)
+    if file_format not in FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unsupported import format, expected one of {list(FORMATS)}")
+    return file_format
+
+
+def _save_upload(file: UploadFile, path: str):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as target:
+        shutil.copyfileobj(file.file, target)
+
+
+@router.post("/import", status_code=202, response_model=ImportJob)
+@admin_required
+async def import_books(
+    file: UploadFile,
+    file_format: str | None = Query(None, alias="format"),
+    current_user: TokenData = Depends(get_token_data),
+):
+    """Queue an import of a CSV or NDJSON catalog; the format defaults to the one of the file extension."""
+    file_format = _import_format(file, file_format)
+    job_id = str(uuid.uuid4())
+    path = os.path.join(fastapi_config.IMPORTS_DIR, f"{job_id}.{file_format}")
+    await run_in_threadpool(_save_upload, file, path)
+    import_catalog.apply_async(args=[path, file_format], task_id=job_id)
+    return {"job_id": job_id, "state": "PENDING"}
+
+
+@router.get("/import/{job_id}", response_model=ImportJob)
+@admin_required
+async def get_import(
+    job_id: str,
+    current_user: TokenData = Depends(get_token_data),
+):
+    result = AsyncResult(job_id, app=celery_app)
+    if result.state == "FAILURE":
+        return {"job_id": job_id, "state": result.state, "error": str(result.result)}
+    progress = result.info if isinstance(result.info, dict) else None
+    return {"job_id": job_id, "state": result.state, "progress": progress}
+
+
+@router.put("/{book_id}", response_model=Book)
+@admin_required
+@drop_cache("search")
 async def update_book(
     book_id: int,
     book_data: BookUpdate,
-    current_user: UserModel = Depends(get_current_user),
+    current_user: TokenData = Depends(get_token_data),
     session: AsyncSession = Depends(get_session),
 ):
-    book = await BookModel.get_by_id(session, book_id)
-    if not book:
-        raise HTTPException(status_code=404, detail="Book not found")
     if not any([book_data.title, book_data.description, book_data.author_ids]):
         raise HTTPException(status_code=400, detail="Please fill in some information about the book!")
 
-    book.title = book_data.title or book.title
-    book.description = book_data.description or book.description
-    book.authors = await AuthorModel.get_by_ids(session, book_data.author_ids) if book_data.author_ids else book.authors
-    await book.save_to_db(session)
-    return (await BookModel.get_by_id(session, book.id)).to_dict()
+    book = await BookModel.update(session, book_id, book_data.title, book_data.description, book_data.author_ids)
+    if not book:
+        raise HTTPException(status_code=404, detail="Book not found")
+    # Entries that already mention the book, plus lists of the authors it was just linked to
+    tags = [f"book:{book_id}"] + [f"author:{author_id}" for author_id in book_data.author_ids or []]
+    if book_data.title:
+        tags.append("books:title")
+    await invalidate_tags(*tags)
+    return book
 
 
 @router.delete("/{book_id}")
 @admin_required
-@drop_cache("books")
-@drop_cache("authors")
+@drop_cache("search")
 async def delete_book(
     book_id: int,
-    current_user: UserModel = Depends(get_current_user),
+    current_user: TokenData = Depends(get_token_data),
     session: AsyncSession = Depends(get_session),
 ):
     status_code = await BookModel.delete_by_id(session, book_id)
     if status_code == 200:
+        await invalidate_tags(f"book:{book_id}")
         return {"detail": "Book has been deleted"}
     elif status_code == 404:
         raise HTTPException(status_code=404, detail="Book not found")
 
 
+@router.post("/{book_id}/authors/{author_id}", response_model=Book)
+@admin_required
+@drop_cache("search")
+async def add_book_author(
+    book_id: int,
+    author_id: int,
+    current_user: TokenData = Depends(get_token_data),
+    session: AsyncSession = Depends(get_session),
+):
+    book, linked = await BookModel.link_author(session, book_id, author_id)
+    if not book:
+        raise HTTPException(status_code=404, detail="Book not found")
+    if linked:
+        await invalidate_tags(f"book:{book_id}", f"author:{author_id}")
+    elif not await AuthorModel.active_ids(session, [author_id]):
+        raise HTTPException(status_code=404, detail="Author not found")
+    return book
+
+
+@router.delete("/{book_id}/authors/{author_id}", response_model=Book)
+@admin_required
+@drop_cache("search")
+async def remove_book_author(
+    book_id: int,
+    author_id: int,
+    current_user: TokenData = Depends(get_token_data),
+    session: AsyncSession = Depends(get_session),
+):
+    book, unlinked = await BookModel.unlink_author(session, book_id, author_id)
+    if not book:
+        raise HTTPException(status_code=404, detail="Book not found")
+    if unlinked:
+        await invalidate_tags(f"book:{book_id}", f"author:{author_id}")
+    return book
+
+
 @router.get("/pdf/")
 async def generate_catalog(
-    current_user: UserModel = Depends(get_current_user),
-    session: AsyncSession = Depends(get_session),
+    current_user: User = Depends(get_current_user),
+    session: AsyncSession = Depends(get_read_session),
 ):
     books = [book.to_dict() for book in await BookModel.return_all(session)]
     generate_pdf.delay(books, "books")
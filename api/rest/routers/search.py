@@ -0,0 +1,35 @@
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from api.database.replicas import get_read_session
+from api.dependencies import get_token_data
+from api.models import BookModel, AuthorModel
+from api.rest.schemas.auth import TokenData
+from api.rest.schemas.search import SearchResults
+from api.redis import cache_it
+
+
+router = APIRouter(
+    prefix="/search",
+    tags=["search"],
+)
+
+
+async def _ranked(model, session: AsyncSession, q: str, limit: int):
+    hits = await model.search(session, q, limit)
+    ranks = {hit.id: hit.rank for hit in hits}
+    return [{**item, "rank": ranks[item["id"]]} for item in await model.get_dicts(session, list(ranks))]
+
+
+@router.get("/", response_model=SearchResults)
+@cache_it("search")
+async def search(
+    q: str = Query(..., min_length=2, max_length=255),
+    limit: int = Query(20, ge=1, le=100),
+    current_user: TokenData = Depends(get_token_data),
+    session: AsyncSession = Depends(get_read_session),
+):
+    return {
+        "books": await _ranked(BookModel, session, q, limit),
+        "authors": await _ranked(AuthorModel, session, q, limit),
+    }
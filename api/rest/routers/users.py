@@ -1,13 +1,19 @@
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Query
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from api import fastapi_config
 from api.database.database import get_session
-from api.dependencies import get_current_user
+from api.database.replicas import get_read_session
+from api.database.pagination import PaginationError
+from api.dependencies import get_token_data
+from api.hashing import HashingQueueFull
 from api.models import UserModel
 from api.rest.schemas import user
-from api.security import admin_required
+from api.rest.schemas.auth import TokenData
+from api.rest.schemas.page import Page
+from api.security import admin_required, revoke_user_refresh_tokens
 from api.tasks.tasks import send_welcome_email
-from api.redis import cache_it, drop_cache
+from api.redis import cache_it, drop_cache, invalidate_tags
 
 
 router = APIRouter(
@@ -16,23 +22,35 @@ router = APIRouter(
 )
 
 
-@router.get("/", response_model=list[user.User])
+def user_tags(page: dict, params: dict):
+    if params.get("sort", "id").lstrip("-") == "login":
+        yield "users:login"
+    yield from (f"user:{u['id']}" for u in page["items"])
+
+
+@router.get("/", response_model=Page[user.User])
 @admin_required
-@cache_it("users")
+@cache_it("users", tags=user_tags)
 async def get_users(
-    current_user: UserModel = Depends(get_current_user),
-    session: AsyncSession = Depends(get_session),
+    limit: int = Query(fastapi_config.PAGE_SIZE_DEFAULT, ge=1, le=fastapi_config.PAGE_SIZE_MAX),
+    after: str | None = None,
+    sort: str = "id",
+    current_user: TokenData = Depends(get_token_data),
+    session: AsyncSession = Depends(get_read_session),
 ):
-    users = await UserModel.return_all(session)
-    return [u.to_dict() for u in users]
+    try:
+        users, next_cursor = await UserModel.get_page(session, limit, after, sort)
+    except PaginationError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"items": [u.to_dict() for u in users], "next_cursor": next_cursor}
 
 
 @router.get("/{user_id}", response_model=user.User)
 @admin_required
 async def get_user(
     user_id: int,
-    current_user: UserModel = Depends(get_current_user),
-    session: AsyncSession = Depends(get_session),
+    current_user: TokenData = Depends(get_token_data),
+    session: AsyncSession = Depends(get_read_session),
 ):
     db_user = await UserModel.get_by_id(session, user_id)
     if db_user:
@@ -45,16 +63,11 @@ async def get_user(
 @drop_cache("users")
 async def create_user(
     user_data: user.UserCreate,
-    current_user: UserModel = Depends(get_current_user),
+    current_user: TokenData = Depends(get_token_data),
     session: AsyncSession = Depends(get_session),
 ):
     try:
-        new_user = UserModel(
-            name=user_data.name,
-            login=user_data.login,
-            hashed_password=UserModel.generate_hash(user_data.password),
-            email=user_data.email,
-        )
+        hashed_password = await UserModel.generate_hash_async(user_data.password)
 
         if user_data.email:
             try:
@@ -64,11 +77,13 @@ async def create_user(
                     status_code=500, detail="Failed to send welcome email. User creation rolled back."
                 ) from e
 
-        await new_user.save_to_db(session)
-        return {"id": new_user.id}
+        new_user = await UserModel.create(session, user_data.name, user_data.login, hashed_password, user_data.email)
+        return {"id": new_user["id"]}
 
     except HTTPException:
         raise
+    except HashingQueueFull as e:
+        raise HTTPException(status_code=503, detail=str(e)) from e
     except Exception as e:
         raise HTTPException(
             status_code=500, detail="Failed to create user. Database access error."
@@ -77,40 +92,52 @@ async def create_user(
 
 @router.put("/{user_id}", response_model=user.User)
 @admin_required
-@drop_cache("users")
 async def update_user(
     user_id: int,
     user_data: user.UserUpdate,
-    current_user: UserModel = Depends(get_current_user),
+    current_user: TokenData = Depends(get_token_data),
     session: AsyncSession = Depends(get_session),
 ):
-    db_user = await UserModel.get_by_id(session, user_id)
-
-    if not db_user:
-        raise HTTPException(status_code=404, detail="User not found")
-
     if not any([user_data.name, user_data.login, user_data.password, user_data.email]):
         raise HTTPException(status_code=400, detail="Please provide valid information about the user")
 
-    db_user.name = user_data.name or db_user.name
-    db_user.login = user_data.login or db_user.login
-    db_user.email = user_data.email or db_user.email
-    db_user.hashed_password = UserModel.generate_hash(user_data.password) if user_data.password else db_user.hashed_password
-    await db_user.save_to_db(session)
+    try:
+        hashed_password = await UserModel.generate_hash_async(user_data.password) if user_data.password else None
+    except HashingQueueFull as e:
+        raise HTTPException(status_code=503, detail=str(e)) from e
+    updated = await UserModel.update(
+        session,
+        user_id,
+        name=user_data.name,
+        login=user_data.login,
+        email=user_data.email,
+        hashed_password=hashed_password,
+    )
+    if not updated:
+        raise HTTPException(status_code=404, detail="User not found")
+
+    db_user, previous = updated
+    if user_data.password or db_user["login"] != previous["login"] or db_user["is_admin"] != previous["is_admin"]:
+        # Sessions started with the old credentials, under the old login or with the old groups must not be refreshed
+        await revoke_user_refresh_tokens(previous["login"])
+    tags = [f"user:{user_id}"]
+    if user_data.login:
+        tags.append("users:login")
+    await invalidate_tags(*tags)
 
-    return db_user.to_dict()
+    return db_user
 
 
 @router.delete("/{user_id}")
 @admin_required
-@drop_cache("users")
 async def delete_user(
     user_id: int,
-    current_user: UserModel = Depends(get_current_user),
+    current_user: TokenData = Depends(get_token_data),
     session: AsyncSession = Depends(get_session),
 ):
-    status_code = await UserModel.delete_by_id(session, user_id)
-    if status_code == 200:
-        return {"detail": "User has been deleted"}
-    elif status_code == 404:
+    db_user = await UserModel.deactivate(session, user_id)
+    if not db_user:
         raise HTTPException(status_code=404, detail="User not found")
+    await revoke_user_refresh_tokens(db_user["login"])
+    await invalidate_tags(f"user:{user_id}")
+    return {"detail": "User has been deleted"}
@@ -11,5 +11,14 @@ class Token(BaseModel):
     refresh_token: str
 
 
+class RefreshRequest(BaseModel):
+    refresh_token: str
+
+
 class TokenData(BaseModel):
     login: str | None = None
+    groups: list[str] = []
+
+    @property
+    def is_admin(self) -> bool:
+        return "admin" in self.groups
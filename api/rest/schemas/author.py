@@ -14,9 +14,22 @@ class AuthorUpdate(AuthorBase):
     book_ids: list[int] | None = None
 
 
+class AuthorBulkUpdate(AuthorUpdate):
+    id: int
+
+
 class Author(AuthorBase):
     id: int
     books: list[dict]
+    books_count: int
 
     class Config:
         orm_mode = True
+
+
+class AuthorFields(BaseModel):
+    """An author trimmed by the `fields` and `expand` query parameters; what was left out is unset."""
+    id: int
+    name: str | None = None
+    books: list[dict] | None = None
+    books_count: int | None = None
@@ -15,9 +15,23 @@ class BookUpdate(BookBase):
     author_ids: list[int] | None = None
 
 
+class BookBulkUpdate(BookUpdate):
+    id: int
+
+
 class Book(BookBase):
     id: int
     authors: list[dict]
+    authors_count: int
 
     class Config:
         orm_mode = True
+
+
+class BookFields(BaseModel):
+    """A book trimmed by the `fields` and `expand` query parameters; what was left out is unset."""
+    id: int
+    title: str | None = None
+    description: str | None = None
+    authors: list[dict] | None = None
+    authors_count: int | None = None
@@ -0,0 +1,20 @@
+from typing import Annotated
+
+from fastapi import Body
+from pydantic import BaseModel, Field
+
+from api import fastapi_config
+
+
+def Batch(item_type):
+    """Request body holding a list of 1 to BULK_MAX_ITEMS items."""
+    return Annotated[list[item_type], Body(min_length=1, max_length=fastapi_config.BULK_MAX_ITEMS)]
+
+
+class BulkDelete(BaseModel):
+    ids: list[int] = Field(min_length=1, max_length=fastapi_config.BULK_MAX_ITEMS)
+
+
+class BulkDeleted(BaseModel):
+    detail: str
+    ids: list[int]
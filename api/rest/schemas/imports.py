@@ -0,0 +1,9 @@
+from pydantic import BaseModel
+
+
+class ImportJob(BaseModel):
+    job_id: str
+    state: str
+    # Counters of the catalog import (see api.tasks.catalog_import.ImportProgress), once it has started
+    progress: dict | None = None
+    error: str | None = None
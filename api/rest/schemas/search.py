@@ -0,0 +1,17 @@
+from pydantic import BaseModel
+
+from api.rest.schemas.author import Author
+from api.rest.schemas.book import Book
+
+
+class BookHit(Book):
+    rank: float
+
+
+class AuthorHit(Author):
+    rank: float
+
+
+class SearchResults(BaseModel):
+    books: list[BookHit]
+    authors: list[AuthorHit]
@@ -1,35 +1,130 @@
 from datetime import datetime, timedelta
 from functools import wraps
+import uuid
 
 from fastapi import HTTPException, Depends
-from jose import jwt
+from jose import JWTError, jwt
 
 from api import fastapi_config
-from api.dependencies import get_current_user
+from api.dependencies import get_token_data
 from api.models import UserModel
+from api.redis import redis_connection
+from api.rest.schemas.auth import TokenData
 
 
-def create_access_token(subject: str, user: UserModel) -> str:
+REFRESH_TOKEN_TTL = fastapi_config.REFRESH_TOKEN_EXPIRE_MINUTES * 60
+# Atomically moves a refresh token family from the presented token to its successor.
+# Returns {1, groups} on rotation, {0} if the family is unknown (revoked or expired), {-1} if an already
+# rotated token was replayed, in which case the whole family is revoked.
+ROTATE_REFRESH_TOKEN_SCRIPT = """
+if redis.call("type", KEYS[1])["ok"] ~= "hash" then
+    return {0}
+end
+if redis.call("hget", KEYS[1], "jti") ~= ARGV[1] then
+    redis.call("del", KEYS[1])
+    return {-1}
+end
+redis.call("hset", KEYS[1], "jti", ARGV[2])
+redis.call("expire", KEYS[1], ARGV[3])
+return {1, redis.call("hget", KEYS[1], "groups")}
+"""
+
+
+class RefreshTokenError(Exception):
+    pass
+
+
+def _groups(user: UserModel | TokenData) -> list[str]:
+    return ["admin", "user"] if user.is_admin else ["user"]
+
+
+def _family_key(family: str) -> str:
+    return f"refresh:family:{family}"
+
+
+def _user_families_key(login: str) -> str:
+    return f"refresh:user:{login}"
+
+
+def create_access_token(subject: str, user: UserModel | TokenData) -> str:
     expires_delta = datetime.utcnow() + timedelta(minutes=fastapi_config.ACCESS_TOKEN_EXPIRE_MINUTES)
-    groups = ["admin", "user"] if user.is_admin else ["user"]
-    to_encode = {"exp": expires_delta, "sub": subject, "groups": groups}
+    to_encode = {"exp": expires_delta, "sub": subject, "groups": _groups(user)}
     encoded_jwt = jwt.encode(
         to_encode, fastapi_config.JWT_SECRET_KEY, fastapi_config.ALGORITHM)
     return encoded_jwt
 
 
-def create_refresh_token(subject: str, user: UserModel) -> str:
+def _encode_refresh_token(subject: str, family: str, jti: str) -> str:
     expires_delta = datetime.utcnow() + timedelta(minutes=fastapi_config.REFRESH_TOKEN_EXPIRE_MINUTES)
-    groups = ["admin", "user"] if user.is_admin else ["user"]
-    to_encode = {"exp": expires_delta, "sub": subject, "groups": groups}
+    to_encode = {"exp": expires_delta, "sub": subject, "fam": family, "jti": jti}
     encoded_jwt = jwt.encode(to_encode, fastapi_config.JWT_REFRESH_SECRET_KEY, fastapi_config.ALGORITHM)
     return encoded_jwt
 
 
+def _decode_refresh_token(refresh_token: str) -> dict:
+    try:
+        payload = jwt.decode(
+            refresh_token, fastapi_config.JWT_REFRESH_SECRET_KEY, algorithms=[fastapi_config.ALGORITHM]
+        )
+    except JWTError:
+        raise RefreshTokenError("Could not validate refresh token")
+    if not all(claim in payload for claim in ("sub", "fam", "jti")):
+        raise RefreshTokenError("Could not validate refresh token")
+    return payload
+
+
+async def create_refresh_token(subject: str, user: UserModel) -> str:
+    """Start a new refresh token family; only its latest token can be exchanged at /refresh.
+
+    The family keeps the user's groups as of the login. Tokens carry no groups, so refreshing can't keep rights
+    the user lost: deactivating a user or changing their admin status must revoke their families.
+    """
+    family, jti = uuid.uuid4().hex, uuid.uuid4().hex
+    async with redis_connection.pipeline(transaction=False) as pipe:
+        pipe.hset(_family_key(family), mapping={"jti": jti, "groups": ",".join(_groups(user))})
+        pipe.expire(_family_key(family), REFRESH_TOKEN_TTL)
+        pipe.sadd(_user_families_key(subject), family)
+        pipe.expire(_user_families_key(subject), REFRESH_TOKEN_TTL)
+        await pipe.execute()
+    return _encode_refresh_token(subject, family, jti)
+
+
+async def rotate_refresh_token(refresh_token: str) -> dict:
+    """Exchange a refresh token for a new access/refresh pair using only its claims and one Redis call."""
+    payload = _decode_refresh_token(refresh_token)
+    login, family, jti = payload["sub"], payload["fam"], payload["jti"]
+    new_jti = uuid.uuid4().hex
+    status, *groups = await redis_connection.eval(
+        ROTATE_REFRESH_TOKEN_SCRIPT, 1, _family_key(family), jti, new_jti, REFRESH_TOKEN_TTL
+    )
+    if status == -1:
+        raise RefreshTokenError("Refresh token has already been used. Please log in again")
+    if status != 1:
+        raise RefreshTokenError("Refresh token has been revoked")
+
+    user = TokenData(login=login, groups=groups[0].decode().split(","))
+    return {
+        "access_token": create_access_token(subject=login, user=user),
+        "refresh_token": _encode_refresh_token(login, family, new_jti),
+    }
+
+
+async def revoke_refresh_token(refresh_token: str):
+    payload = _decode_refresh_token(refresh_token)
+    await redis_connection.delete(_family_key(payload["fam"]))
+
+
+async def revoke_user_refresh_tokens(login: str):
+    families = await redis_connection.smembers(_user_families_key(login))
+    await redis_connection.delete(
+        _user_families_key(login), *[_family_key(family.decode()) for family in families]
+    )
+
+
 def admin_required(func):
     @wraps(func)
-    async def wrapper(*args, current_user: UserModel = Depends(get_current_user), **kwargs):
-        if not current_user.is_admin:
+    async def wrapper(*args, current_user: TokenData = Depends(get_token_data), **kwargs):
+        if "admin" not in current_user.groups:
             raise HTTPException(status_code=403, detail="Access forbidden")
         return await func(*args, **kwargs)
     return wrapper
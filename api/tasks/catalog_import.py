@@ -0,0 +1,125 @@
+"""Streaming import of book catalogs.
+
+Files are read line by line and written in batches of IMPORT_BATCH_SIZE records, so memory use depends on
+the batch size and not on the size of the file.
+
+CSV files need a `title` column and may have `description` and `authors` (names separated by `|`).
+NDJSON files hold one object per line with `title`, `description` and `authors` (a list of names).
+"""
+from itertools import islice
+import csv
+import json
+import os
+
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.pool import NullPool
+
+from api import fastapi_config
+from api.models import AuthorModel, BookModel
+from api.redis import invalidate_namespace, invalidate_tags, redis_connection
+
+FORMATS = ("csv", "ndjson")
+MAX_REPORTED_ERRORS = 20
+
+
+class ImportProgress:
+    def __init__(self, bytes_total: int):
+        self.bytes_total = bytes_total
+        self.bytes_read = 0
+        self.processed = 0
+        self.books = 0
+        self.skipped = 0
+        self.errors = []
+
+    def skip(self, line: int, reason: str):
+        self.skipped += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append(f"line {line}: {reason}")
+
+    def to_dict(self) -> dict:
+        return dict(vars(self))
+
+
+def _lines(file, progress: ImportProgress):
+    for line in file:
+        progress.bytes_read += len(line)
+        yield line.decode("utf-8").lstrip("\ufeff")
+
+
+def _records(file, file_format: str, progress: ImportProgress):
+    """Yield (line, record) for every record of the file; records are dicts, or None when they can't be parsed."""
+    if file_format == "csv":
+        reader = csv.DictReader(_lines(file, progress))
+        for record in reader:
+            yield reader.line_num, {**record, "authors": (record.get("authors") or "").split("|")}
+        return
+
+    for number, line in enumerate(_lines(file, progress), start=1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError:
+            record = None
+        yield number, record if isinstance(record, dict) else None
+
+
+def _clean(record: dict) -> dict | None:
+    title = record.get("title")
+    if not isinstance(title, str) or not title.strip():
+        return None
+    authors = record.get("authors") or []
+    if not isinstance(authors, list):
+        authors = [authors]
+    description = record.get("description")
+    return {
+        "title": title.strip()[:255],
+        "description": description if isinstance(description, str) and description else None,
+        "authors": list(dict.fromkeys(str(name).strip()[:255] for name in authors if str(name).strip())),
+    }
+
+
+async def _write_batch(session: AsyncSession, books: list[dict], progress: ImportProgress):
+    names = list(dict.fromkeys(name for book in books for name in book["authors"]))
+    authors = await AuthorModel.ids_by_name(session, names) if names else {}
+    await BookModel.bulk_create(session, [
+        {
+            "title": book["title"],
+            "description": book["description"],
+            "author_ids": [authors[name] for name in book["authors"]],
+        }
+        for book in books
+    ])
+    progress.books += len(books)
+    await invalidate_tags(*[f"author:{author_id}" for author_id in authors.values()])
+
+
+async def import_catalog(path: str, file_format: str, report) -> dict:
+    """Import the file at `path`, calling `report(progress)` after every batch."""
+    progress = ImportProgress(os.path.getsize(path))
+    engine = create_async_engine(
+        fastapi_config.SQLALCHEMY_DATABASE_URI.replace("postgresql://", "postgresql+asyncpg://"), poolclass=NullPool
+    )
+    try:
+        async with AsyncSession(engine, expire_on_commit=False) as session:
+            with open(path, "rb") as file:
+                records = _records(file, file_format, progress)
+                while batch := list(islice(records, fastapi_config.IMPORT_BATCH_SIZE)):
+                    books = []
+                    for line, record in batch:
+                        book = _clean(record) if record is not None else None
+                        if book is not None:
+                            books.append(book)
+                        else:
+                            progress.skip(line, "missing title" if record is not None else "not a JSON object")
+                    if books:
+                        await _write_batch(session, books, progress)
+                    progress.processed += len(batch)
+                    report(progress)
+        for namespace in ("books", "authors", "search"):
+            await invalidate_namespace(namespace)
+        return progress.to_dict()
+    finally:
+        await engine.dispose()
+        # The task runs on an event loop of its own, so pooled Redis connections can't be reused by the next one
+        await redis_connection.connection_pool.disconnect()
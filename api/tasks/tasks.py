@@ -7,6 +7,7 @@ from fpdf import FPDF
 from asgiref.sync import async_to_sync
 
 from api.email_settings import conf
+from api.tasks import catalog_import
 
 celery_app = Celery(
     "tasks",
@@ -46,3 +47,14 @@ def send_welcome_email(email_to: str, body: dict):
     fm = FastMail(conf)
     send_message_sync = async_to_sync(fm.send_message)  # wrap the asynchronous call
     send_message_sync(message, template_name="welcome.html")
+
+
+@celery_app.task(bind=True)
+def import_catalog(self, path: str, file_format: str):
+    def report(progress):
+        self.update_state(state="PROGRESS", meta=progress.to_dict())
+
+    try:
+        return async_to_sync(catalog_import.import_catalog)(path, file_format, report)
+    finally:
+        os.remove(path)
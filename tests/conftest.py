@@ -1,5 +1,6 @@
 import pytest
 from fastapi.testclient import TestClient
+from redis import Redis
 from sqlalchemy import create_engine
 from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 from sqlalchemy.orm import Session as SyncSession
@@ -22,6 +23,12 @@ def test_db():
     drop_database(sync_url)
 
 
+@pytest.fixture(scope="session", autouse=True)
+def clear_cache():
+    """Entries cached by a previous run would point at ids reused by the freshly created test database."""
+    Redis(host="redis", port=6379, db=1).flushdb()
+
+
 @pytest.fixture(scope="session")
 def sync_engine(test_db):
     engine = create_engine(test_db)
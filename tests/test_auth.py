@@ -0,0 +1,45 @@
+def _login(client, user):
+    response = client.post("/login", data={"username": user.login, "password": "password"})
+    assert response.status_code == 200
+    return response.json()
+
+
+def test_refresh_rotates_tokens(client, regular_user):
+    tokens = _login(client, regular_user)
+    response = client.post("/refresh", json={"refresh_token": tokens["refresh_token"]})
+    assert response.status_code == 200
+    rotated = response.json()
+    assert rotated["refresh_token"] != tokens["refresh_token"]
+
+    books = client.get("/books", headers={"Authorization": f"Bearer {rotated['access_token']}"})
+    assert books.status_code == 200
+
+
+def test_refresh_token_reuse_revokes_family(client, regular_user):
+    tokens = _login(client, regular_user)
+    rotated = client.post("/refresh", json={"refresh_token": tokens["refresh_token"]}).json()
+
+    replayed = client.post("/refresh", json={"refresh_token": tokens["refresh_token"]})
+    assert replayed.status_code == 401
+    response = client.post("/refresh", json={"refresh_token": rotated["refresh_token"]})
+    assert response.status_code == 401
+
+
+def test_logout_revokes_refresh_token(client, regular_user):
+    tokens = _login(client, regular_user)
+    assert client.post("/logout", json={"refresh_token": tokens["refresh_token"]}).status_code == 200
+    response = client.post("/refresh", json={"refresh_token": tokens["refresh_token"]})
+    assert response.status_code == 401
+
+
+def test_refresh_rejects_access_token(client, regular_user):
+    tokens = _login(client, regular_user)
+    response = client.post("/refresh", json={"refresh_token": tokens["access_token"]})
+    assert response.status_code == 401
+
+
+def test_refresh_after_deactivation_is_revoked(client, regular_user, admin_headers):
+    tokens = _login(client, regular_user)
+    assert client.delete(f"/users/{regular_user.id}", headers=admin_headers).status_code == 200
+    response = client.post("/refresh", json={"refresh_token": tokens["refresh_token"]})
+    assert response.status_code == 401
@@ -1,10 +1,28 @@
+import csv
+import io
+
 import pytest
 
+from api import fastapi_config
+from tests.factories import AuthorFactory, BookFactory
+
 
 def test_get_authors(client, user_headers):
     response = client.get("/authors", headers=user_headers)
     assert response.status_code == 200
-    assert isinstance(response.json(), list)
+    assert isinstance(response.json()["items"], list)
+
+
+def test_get_authors_sorted_by_name(client, user_headers):
+    AuthorFactory(name="Zed"), AuthorFactory(name="Abe")
+    response = client.get("/authors", headers=user_headers, params={"sort": "-name", "limit": 1})
+    assert response.status_code == 200
+    data = response.json()
+    assert len(data["items"]) == 1
+    assert data["next_cursor"]
+
+    response = client.get("/authors", headers=user_headers, params={"sort": "id", "after": data["next_cursor"]})
+    assert response.status_code == 400
 
 
 @pytest.mark.parametrize("name, expected_status", [
@@ -34,6 +52,52 @@ def test_get_author(client, user_headers, author):
     assert data["name"] == author.name
 
 
+def test_get_author_sparse_fields(client, user_headers, book, author):
+    response = client.get(f"/authors/{author.id}", headers=user_headers, params={"expand": "books"})
+    assert response.status_code == 200
+    assert response.json() == {
+        "id": author.id,
+        "name": author.name,
+        "books": [{"id": book.id, "title": book.title}],
+        "books_count": 1,
+    }
+
+    response = client.get("/authors", headers=user_headers, params={"fields": "name"})
+    assert all(set(item) == {"id", "name"} for item in response.json()["items"])
+
+
+def test_get_author_reflects_book_update(client, admin_headers, book, author):
+    client.get(f"/authors/{author.id}", headers=admin_headers)
+    client.put(f"/books/{book.id}", headers=admin_headers, json={"title": "Renamed Book"})
+    response = client.get(f"/authors/{author.id}", headers=admin_headers)
+    assert {"id": book.id, "title": "Renamed Book"} in response.json()["books"]
+
+
+def test_get_author_bounds_embedded_books(client, user_headers, db_session, monkeypatch):
+    monkeypatch.setattr(fastapi_config, "RELATED_ITEMS_MAX", 2)
+    author = AuthorFactory()
+    books = [BookFactory() for _ in range(3)]
+    for book in books:
+        book.authors.append(author)
+    db_session.commit()
+    ids = sorted(book.id for book in books)
+
+    data = client.get(f"/authors/{author.id}", headers=user_headers).json()
+    assert data["books_count"] == 3
+    assert [book["id"] for book in data["books"]] == ids[:2]
+
+    first = client.get(f"/authors/{author.id}/books", headers=user_headers, params={"limit": 2}).json()
+    params = {"limit": 2, "after": first["next_cursor"], "fields": "id"}
+    second = client.get(f"/authors/{author.id}/books", headers=user_headers, params=params).json()
+    assert [book["id"] for book in first["items"] + second["items"]] == ids
+    assert second["next_cursor"] is None
+
+
+def test_get_author_books_not_found(client, user_headers):
+    response = client.get("/authors/99999/books", headers=user_headers)
+    assert response.status_code == 404
+
+
 def test_get_author_not_found(client, user_headers):
     response = client.get("/authors/99999", headers=user_headers)
     assert response.status_code == 404
@@ -62,3 +126,33 @@ def test_delete_author(client, admin_headers, author):
 def test_delete_author_not_found(client, admin_headers):
     response = client.delete("/authors/99999", headers=admin_headers)
     assert response.json()["detail"] == "Author not found"
+
+
+def test_bulk_create_authors(client, admin_headers, book):
+    response = client.post("/authors/bulk", headers=admin_headers, json=[
+        {"name": "Bulk Author", "book_ids": [book.id]},
+        {"name": "Bulk Other"},
+    ])
+    assert response.status_code == 201
+    data = response.json()
+    assert [author["name"] for author in data] == ["Bulk Author", "Bulk Other"]
+    assert data[0]["books"] == [{"id": book.id, "title": book.title}]
+
+
+def test_bulk_update_and_delete_authors(client, admin_headers, author):
+    response = client.patch("/authors/bulk", headers=admin_headers, json=[{"id": author.id, "name": "Bulk Renamed"}])
+    assert response.status_code == 200
+    assert response.json()[0]["name"] == "Bulk Renamed"
+
+    response = client.request("DELETE", "/authors/bulk", headers=admin_headers, json={"ids": [author.id, 99999]})
+    assert response.status_code == 404
+    response = client.request("DELETE", "/authors/bulk", headers=admin_headers, json={"ids": [author.id]})
+    assert response.status_code == 200
+    assert client.get(f"/authors/{author.id}", headers=admin_headers).status_code == 404
+
+
+def test_export_authors_csv(client, user_headers, author, book):
+    response = client.get("/authors/export", headers=user_headers, params={"format": "csv"})
+    assert response.status_code == 200
+    rows = {int(row["id"]): row for row in csv.DictReader(io.StringIO(response.text))}
+    assert book.title in rows[author.id]["books"].split("|")
@@ -1,10 +1,62 @@
+import csv
+import io
+import json
+
 import pytest
 
+from api.database.pagination import encode_cursor
+from tests.factories import AuthorFactory, BookFactory
+
 
 def test_get_books(client, user_headers):
     response = client.get("/books", headers=user_headers)
     assert response.status_code == 200
-    assert isinstance(response.json(), list)
+    assert isinstance(response.json()["items"], list)
+
+
+def test_get_books_paginated(client, user_headers):
+    ids = [BookFactory().id for _ in range(3)]
+    seen = []
+    cursor = None
+    while True:
+        params = {"limit": 2, "after": cursor} if cursor else {"limit": 2}
+        response = client.get("/books", headers=user_headers, params=params)
+        assert response.status_code == 200
+        data = response.json()
+        assert len(data["items"]) <= 2
+        seen.extend(item["id"] for item in data["items"])
+        cursor = data["next_cursor"]
+        if not cursor:
+            break
+    assert seen == sorted(seen)
+    assert set(ids) <= set(seen)
+
+
+def test_get_books_cache_respects_filters(client, user_headers):
+    book = BookFactory(title="Cachedfilter")
+    client.get("/books", headers=user_headers)
+    response = client.get("/books", headers=user_headers, params={"title": "cachedfilter"})
+    assert response.status_code == 200
+    assert [item["id"] for item in response.json()["items"]] == [book.id]
+
+
+def test_update_book_invalidates_cached_lists(client, admin_headers, book):
+    client.get("/books", headers=admin_headers, params={"limit": 500})
+    client.put(f"/books/{book.id}", headers=admin_headers, json={"description": "Changed"})
+    response = client.get("/books", headers=admin_headers, params={"limit": 500})
+    items = {item["id"]: item for item in response.json()["items"]}
+    assert items[book.id]["description"] == "Changed"
+
+
+@pytest.mark.parametrize("params", [
+    {"after": "not-a-cursor"},
+    {"after": encode_cursor("id", "1", "1")},
+    {"sort": "title", "after": encode_cursor("title", 5, 1)},
+    {"sort": "description"},
+])
+def test_get_books_invalid_page(client, user_headers, params):
+    response = client.get("/books", headers=user_headers, params=params)
+    assert response.status_code == 400
 
 
 def test_create_book(client, admin_headers, author):
@@ -38,6 +90,41 @@ def test_get_book(client, user_headers, book, author):
     assert any(a["id"] == author.id for a in data["authors"])
 
 
+def test_get_books_sparse_fields(client, user_headers, book):
+    response = client.get("/books", headers=user_headers, params={"fields": "title", "title": book.title})
+    assert response.status_code == 200
+    assert {"id": book.id, "title": book.title} in response.json()["items"]
+    assert all(set(item) == {"id", "title"} for item in response.json()["items"])
+
+
+def test_get_book_expand_authors(client, user_headers, book, author):
+    response = client.get(f"/books/{book.id}", headers=user_headers, params={"fields": "id", "expand": "authors"})
+    assert response.status_code == 200
+    data = response.json()
+    assert set(data) == {"id", "authors", "authors_count"}
+    assert {"id": author.id, "name": author.name} in data["authors"]
+
+
+@pytest.mark.parametrize("params", [{"fields": "isbn"}, {"expand": "books"}])
+def test_get_books_unknown_fields(client, user_headers, params):
+    response = client.get("/books", headers=user_headers, params=params)
+    assert response.status_code == 400
+
+
+def test_get_book_authors(client, user_headers, book, author):
+    response = client.get(f"/books/{book.id}/authors", headers=user_headers, params={"fields": "name"})
+    assert response.status_code == 200
+    assert response.json()["items"] == [{"id": author.id, "name": author.name}]
+    assert client.get(f"/books/{book.id}", headers=user_headers).json()["authors_count"] == 1
+
+
+def test_get_book_reflects_update(client, admin_headers, book):
+    client.get(f"/books/{book.id}", headers=admin_headers)
+    client.put(f"/books/{book.id}", headers=admin_headers, json={"description": "Written through"})
+    response = client.get(f"/books/{book.id}", headers=admin_headers)
+    assert response.json()["description"] == "Written through"
+
+
 def test_get_book_not_found(client, user_headers):
     response = client.get("/books/99999", headers=user_headers)
     assert response.status_code == 404
@@ -49,6 +136,44 @@ def test_update_book(client, admin_headers, book):
     assert response.json()["title"] == "Updated Title"
 
 
+def test_update_book_relinks_active_authors(client, admin_headers, book, author):
+    deleted = AuthorFactory(is_active=False)
+    response = client.put(f"/books/{book.id}", headers=admin_headers, json={"author_ids": [author.id, deleted.id]})
+    assert response.status_code == 200
+    assert response.json()["authors"] == [{"id": author.id, "name": author.name}]
+    assert response.json()["title"] == book.title
+
+
+def test_link_and_unlink_book_author(client, admin_headers, book, author):
+    other = AuthorFactory()
+    response = client.post(f"/books/{book.id}/authors/{other.id}", headers=admin_headers)
+    assert response.status_code == 200
+    assert {"id": other.id, "name": other.name} in response.json()["authors"]
+    assert {"id": author.id, "name": author.name} in response.json()["authors"]
+    assert any(b["id"] == book.id for b in client.get(f"/authors/{other.id}", headers=admin_headers).json()["books"])
+
+    response = client.delete(f"/books/{book.id}/authors/{other.id}", headers=admin_headers)
+    assert response.status_code == 200
+    assert response.json()["authors"] == [{"id": author.id, "name": author.name}]
+    assert client.get(f"/authors/{other.id}", headers=admin_headers).json()["books"] == []
+
+
+def test_link_book_author_unchanged(client, admin_headers, book, author):
+    response = client.post(f"/books/{book.id}/authors/{author.id}", headers=admin_headers)
+    assert response.status_code == 200
+    assert response.json()["authors"] == [{"id": author.id, "name": author.name}]
+
+    other = AuthorFactory()
+    response = client.delete(f"/books/{book.id}/authors/{other.id}", headers=admin_headers)
+    assert response.status_code == 200
+    assert response.json()["authors"] == [{"id": author.id, "name": author.name}]
+
+
+def test_link_book_author_not_found(client, admin_headers, book):
+    assert client.post(f"/books/{book.id}/authors/99999", headers=admin_headers).status_code == 404
+    assert client.post("/books/99999/authors/1", headers=admin_headers).status_code == 404
+
+
 def test_update_book_empty_fields(client, admin_headers, book):
     response = client.put(f"/books/{book.id}", headers=admin_headers, json={"title": ""})
     assert response.status_code == 400
@@ -65,6 +190,97 @@ def test_delete_book(client, admin_headers, book):
     assert response.json()["detail"] == "Book has been deleted"
 
 
+def test_get_deleted_book(client, admin_headers, book):
+    client.get(f"/books/{book.id}", headers=admin_headers)
+    client.delete(f"/books/{book.id}", headers=admin_headers)
+    response = client.get(f"/books/{book.id}", headers=admin_headers)
+    assert response.status_code == 404
+
+
 def test_delete_book_not_found(client, admin_headers):
     response = client.delete("/books/99999", headers=admin_headers)
     assert response.status_code == 404
+
+
+def test_bulk_create_books(client, admin_headers, author):
+    response = client.post("/books/bulk", headers=admin_headers, json=[
+        {"title": "Bulk One", "author_ids": [author.id]},
+        {"title": "Bulk Two", "description": "Second"},
+    ])
+    assert response.status_code == 201
+    data = response.json()
+    assert [book["title"] for book in data] == ["Bulk One", "Bulk Two"]
+    assert data[0]["authors"] == [{"id": author.id, "name": author.name}]
+    assert data[1]["description"] == "Second"
+
+
+def test_bulk_update_books(client, admin_headers, book, author):
+    other = BookFactory()
+    client.get(f"/books/{book.id}", headers=admin_headers)
+    response = client.patch("/books/bulk", headers=admin_headers, json=[
+        {"id": book.id, "title": "Bulk Renamed"},
+        {"id": other.id, "author_ids": [author.id]},
+    ])
+    assert response.status_code == 200
+    assert client.get(f"/books/{book.id}", headers=admin_headers).json()["title"] == "Bulk Renamed"
+    author_books = client.get(f"/authors/{author.id}", headers=admin_headers).json()["books"]
+    assert {"id": book.id, "title": "Bulk Renamed"} in author_books
+    assert any(b["id"] == other.id for b in author_books)
+
+
+def test_bulk_update_books_not_found(client, admin_headers, book):
+    response = client.patch("/books/bulk", headers=admin_headers, json=[
+        {"id": book.id, "title": "Never Saved"},
+        {"id": 99999, "title": "Ghost"},
+    ])
+    assert response.status_code == 404
+    assert client.get(f"/books/{book.id}", headers=admin_headers).json()["title"] == book.title
+
+
+def test_bulk_delete_books(client, admin_headers):
+    ids = [BookFactory().id for _ in range(2)]
+    response = client.request("DELETE", "/books/bulk", headers=admin_headers, json={"ids": ids})
+    assert response.status_code == 200
+    assert all(client.get(f"/books/{book_id}", headers=admin_headers).status_code == 404 for book_id in ids)
+
+
+def test_bulk_requires_items(client, admin_headers):
+    response = client.post("/books/bulk", headers=admin_headers, json=[])
+    assert response.status_code == 422
+
+
+def test_import_books_queues_job(client, admin_headers):
+    files = {"file": ("catalog.csv", b"title,description,authors\nImported,,Import Author\n", "text/csv")}
+    response = client.post("/books/import", headers=admin_headers, files=files)
+    assert response.status_code == 202
+    job_id = response.json()["job_id"]
+    status = client.get(f"/books/import/{job_id}", headers=admin_headers)
+    assert status.status_code == 200
+    assert status.json()["job_id"] == job_id
+
+
+def test_import_books_unsupported_format(client, admin_headers):
+    files = {"file": ("catalog.xml", b"<books/>", "application/xml")}
+    response = client.post("/books/import", headers=admin_headers, files=files)
+    assert response.status_code == 400
+
+
+def test_import_books_requires_admin(client, user_headers):
+    files = {"file": ("catalog.csv", b"title\nForbidden\n", "text/csv")}
+    response = client.post("/books/import", headers=user_headers, files=files)
+    assert response.status_code == 403
+
+
+def test_export_books(client, user_headers, book, author):
+    response = client.get("/books/export", headers=user_headers)
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/x-ndjson"
+    books = [json.loads(line) for line in response.text.splitlines()]
+    assert {"id": author.id, "name": author.name} in next(b for b in books if b["id"] == book.id)["authors"]
+
+
+def test_export_books_csv(client, user_headers, book):
+    response = client.get("/books/export", headers=user_headers, params={"format": "csv", "title": book.title})
+    assert response.status_code == 200
+    rows = list(csv.DictReader(io.StringIO(response.text)))
+    assert book.id in [int(row["id"]) for row in rows]
@@ -0,0 +1,110 @@
+import hashlib
+
+from tests.factories import BookFactory
+
+
+def _query(client, query, variables=None):
+    response = client.post("/graphql", json={"query": query, "variables": variables or {}})
+    assert response.status_code == 200
+    body = response.json()
+    assert "errors" not in body, body.get("errors")
+    return body["data"]
+
+
+def _nodes(connection):
+    return [edge["node"] for edge in connection["edges"]]
+
+
+def test_books_resolve_authors(client, book, author):
+    data = _query(client, "{ books(first: 500) { edges { node { id authors { id name } } } } }")
+    books = {b["id"]: b for b in _nodes(data["books"])}
+    assert {"id": author.id, "name": author.name} in books[book.id]["authors"]
+
+
+def test_authors_resolve_books(client, book, author):
+    data = _query(client, "{ authors(first: 500) { edges { node { id books { id title } } } } }")
+    authors = {a["id"]: a for a in _nodes(data["authors"])}
+    assert {"id": book.id, "title": book.title} in authors[author.id]["books"]
+
+
+def test_books_with_fragments_and_partial_selection(client, book, author):
+    data = _query(client, """
+        { books(authorId: %d) { edges { node { ...BookFields authors { name } } } } }
+        fragment BookFields on Book { id title }
+    """ % author.id)
+    assert _nodes(data["books"]) == [{"id": book.id, "title": book.title, "authors": [{"name": author.name}]}]
+
+
+def test_users_partial_selection(client, regular_user):
+    data = _query(client, "{ users(loginContains: \"%s\") { edges { node { login isActive } } } }" % regular_user.login)
+    assert {"login": regular_user.login, "isActive": True} in _nodes(data["users"])
+
+
+def test_books_connection_pages(client):
+    ids = [BookFactory(title=f"Connection {i}").id for i in range(3)]
+    query = """
+        query ($after: String) {
+            books(first: 2, after: $after, titleContains: "connection") {
+                totalCount
+                pageInfo { hasNextPage endCursor }
+                edges { node { id } }
+            }
+        }
+    """
+    first_page = _query(client, query)["books"]
+    assert first_page["totalCount"] == 3
+    assert first_page["pageInfo"]["hasNextPage"] is True
+    second_page = _query(client, query, {"after": first_page["pageInfo"]["endCursor"]})["books"]
+    assert second_page["pageInfo"]["hasNextPage"] is False
+    assert [node["id"] for node in _nodes(first_page) + _nodes(second_page)] == ids
+
+
+def test_books_filter_by_active_flag(client):
+    book = BookFactory(title="Inactivefilter", is_active=False)
+    active = _query(client, '{ books(titleContains: "inactivefilter") { edges { node { id } } } }')
+    inactive = _query(client, '{ books(titleContains: "inactivefilter", isActive: false) { edges { node { id } } } }')
+    assert _nodes(active["books"]) == []
+    assert _nodes(inactive["books"]) == [{"id": book.id}]
+
+
+def test_books_invalid_page_arguments(client):
+    response = client.post("/graphql", json={"query": "{ books(first: 0) { edges { cursor } } }"})
+    assert response.json()["errors"]
+
+
+def test_persisted_query_registration(client, book):
+    query = "{ books(first: 500) { edges { node { id } } } }"
+    extensions = {"persistedQuery": {"version": 1, "sha256Hash": hashlib.sha256(query.encode()).hexdigest()}}
+
+    response = client.post("/graphql", json={"extensions": extensions})
+    assert response.json()["errors"][0]["extensions"]["code"] == "PERSISTED_QUERY_NOT_FOUND"
+
+    registered = client.post("/graphql", json={"query": query, "extensions": extensions}).json()
+    by_hash = client.post("/graphql", json={"extensions": extensions}).json()
+    assert by_hash == registered
+    assert {"node": {"id": book.id}} in by_hash["data"]["books"]["edges"]
+
+
+def test_persisted_query_hash_mismatch(client):
+    extensions = {"persistedQuery": {"version": 1, "sha256Hash": "0" * 64}}
+    response = client.post("/graphql", json={"query": "{ books { totalCount } }", "extensions": extensions})
+    assert response.status_code == 400
+
+
+def test_expensive_query_rejected(client):
+    query = "{ books(first: 500) { edges { node { authors { books { authors { books { id } } } } } } } }"
+    response = client.post("/graphql", json={"query": query})
+    assert response.json()["errors"][0]["extensions"]["code"] == "QUERY_TOO_EXPENSIVE"
+    assert response.json()["data"] is None
+
+
+def test_cached_query_evicted_on_write(client, admin_headers):
+    query = 'query @cached(ttl: 60) { books(titleContains: "resultcache") { totalCount } }'
+    assert _query(client, query)["books"]["totalCount"] == 0
+    # Written behind the models' back, so the cached result is served
+    BookFactory(title="Resultcache unseen")
+    assert _query(client, query)["books"]["totalCount"] == 0
+
+    response = client.post("/books", headers=admin_headers, json={"title": "Resultcache", "author_ids": []})
+    assert response.status_code == 201
+    assert _query(client, query)["books"]["totalCount"] == 2
@@ -0,0 +1,39 @@
+import asyncio
+
+import pytest
+
+from api import fastapi_config, hashing
+
+
+@pytest.fixture(autouse=True)
+def executor(monkeypatch):
+    monkeypatch.setattr(fastapi_config, "HASHING_WORKERS", 1)
+    yield
+    hashing.shutdown()
+
+
+def test_hash_and_verify_password():
+    password_hash = asyncio.run(hashing.hash_password("secret"))
+    assert password_hash != "secret"
+    assert asyncio.run(hashing.verify_password("secret", password_hash))
+    assert not asyncio.run(hashing.verify_password("wrong", password_hash))
+
+
+def test_hashing_queue_full(monkeypatch):
+    monkeypatch.setattr(fastapi_config, "HASHING_MAX_QUEUE", 0)
+    with pytest.raises(hashing.HashingQueueFull):
+        asyncio.run(hashing.hash_password("secret"))
+    assert hashing._pending == 0
+
+
+def test_hashing_queue_frees_slots(monkeypatch):
+    monkeypatch.setattr(fastapi_config, "HASHING_MAX_QUEUE", 1)
+
+    async def hash_twice():
+        return await asyncio.gather(
+            hashing.hash_password("first"), hashing.hash_password("second"), return_exceptions=True
+        )
+
+    first, second = asyncio.run(hash_twice())
+    assert isinstance(second, hashing.HashingQueueFull)
+    assert asyncio.run(hashing.verify_password("first", first))
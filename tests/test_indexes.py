@@ -0,0 +1,41 @@
+import pytest
+from sqlalchemy import select, text
+from sqlalchemy.dialects import postgresql
+
+from api.models import AuthorModel, BookModel
+from api.models.book import book_author_association
+
+
+def _index_names(plan: dict):
+    if "Index Name" in plan:
+        yield plan["Index Name"]
+    for child in plan.get("Plans", []):
+        yield from _index_names(child)
+
+
+def _plan_indexes(sync_engine, query) -> set[str]:
+    sql = str(query.compile(dialect=postgresql.dialect(), compile_kwargs={"literal_binds": True}))
+    with sync_engine.connect() as connection:
+        # The test tables are tiny, so sequential scans would win regardless of the indexes
+        connection.execute(text("SET LOCAL enable_seqscan = off"))
+        plan = connection.execute(text(f"EXPLAIN (FORMAT JSON) {sql}")).scalar_one()
+        connection.rollback()
+    return set(_index_names(plan[0]["Plan"]))
+
+
+@pytest.mark.parametrize("query, index", [
+    (
+        select(book_author_association).where(book_author_association.c.book_id.in_([1, 2])),
+        "book_author_association_pkey",
+    ),
+    (BookModel._filter(select(BookModel.id), author_id=1), "ix_book_author_association_author_id"),
+    (AuthorModel._filter(select(AuthorModel.id), name="Author"), "ix_authors_name"),
+    (
+        BookModel._filter(select(BookModel.id)).order_by(BookModel.title, BookModel.id).limit(50),
+        "ix_books_active_title",
+    ),
+    (BookModel._filter(select(BookModel.id)).order_by(BookModel.id).limit(50), "ix_books_active_id"),
+    (AuthorModel._filter(select(AuthorModel.id)).order_by(AuthorModel.id).limit(50), "ix_authors_active_id"),
+])
+def test_hot_queries_use_indexes(sync_engine, query, index):
+    assert index in _plan_indexes(sync_engine, query)
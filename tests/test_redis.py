@@ -0,0 +1,207 @@
+import asyncio
+import json
+import time
+
+import fakeredis.aioredis
+import pytest
+
+from api import redis as cache
+
+
+@pytest.fixture(autouse=True)
+def fake_redis(monkeypatch):
+    connection = fakeredis.aioredis.FakeRedis()
+    monkeypatch.setattr(cache, "redis_connection", connection)
+    monkeypatch.setattr(cache, "local_cache", cache.LocalCache(100, 1024 * 1024))
+    monkeypatch.setattr(cache, "CACHE_LOCK_POLL_INTERVAL", 0.01)
+    return connection
+
+
+def _lock_key(namespace: str, **params) -> str:
+    return f"lock:{cache.cache_key(namespace, params)}"
+
+
+def test_cache_it_concurrent_misses_compute_once():
+    calls = 0
+
+    @cache.cache_it("test")
+    async def endpoint(q: str):
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.1)
+        return {"q": q, "call": calls}
+
+    async def main():
+        return await asyncio.gather(*[endpoint(q="x") for _ in range(5)])
+
+    assert asyncio.run(main()) == [{"q": "x", "call": 1}] * 5
+    assert calls == 1
+
+
+def test_cache_it_serves_stale_entry_during_single_refresh(fake_redis):
+    calls = 0
+
+    @cache.cache_it("test", soft_ttl=0)
+    async def endpoint(q: str):
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.05)
+        return calls
+
+    async def main():
+        first = await endpoint(q="x")
+        stale = await asyncio.gather(*[endpoint(q="x") for _ in range(5)])
+        refreshing = await fake_redis.exists(_lock_key("test", q="x"))
+        await cache.wait_for_background_tasks()
+        computed = calls
+        refreshed = await endpoint(q="x")
+        await cache.wait_for_background_tasks()
+        return first, stale, refreshing, computed, refreshed
+
+    first, stale, refreshing, computed, refreshed = asyncio.run(main())
+    assert first == 1
+    assert stale == [1] * 5
+    assert refreshing
+    assert computed == 2
+    assert refreshed == 2
+
+
+def test_cache_it_releases_lock_when_func_raises(fake_redis):
+    fail = True
+
+    @cache.cache_it("test", soft_ttl=0)
+    async def endpoint(q: str):
+        if fail:
+            raise ValueError("database down")
+        return "value"
+
+    async def main():
+        nonlocal fail
+        with pytest.raises(ValueError):
+            await endpoint(q="x")
+        assert not await fake_redis.exists(_lock_key("test", q="x"))
+
+        # A failed background refresh leaves the stale entry in place and frees the lock too
+        fail = False
+        assert await endpoint(q="x") == "value"
+        fail = True
+        assert await endpoint(q="x") == "value"
+        await cache.wait_for_background_tasks()
+        assert not await fake_redis.exists(_lock_key("test", q="x"))
+
+    asyncio.run(main())
+
+
+def test_local_cache_evicts_least_recently_used_entries():
+    local = cache.LocalCache(max_entries=2, max_bytes=100)
+    local.set("a", 1, 10, 60)
+    local.set("b", 2, 10, 60)
+    assert local.get("a") == 1
+    local.set("c", 3, 10, 60)
+    assert local.get("b") is None
+    assert (local.get("a"), local.get("c")) == (1, 3)
+    assert local.size == 20
+
+
+def test_local_cache_evicts_by_size():
+    local = cache.LocalCache(max_entries=10, max_bytes=100)
+    local.set("a", 1, 40, 60)
+    local.set("b", 2, 40, 60)
+    local.set("c", 3, 40, 60)
+    assert local.get("a") is None
+    assert (local.get("b"), local.get("c")) == (2, 3)
+    assert local.size == 80
+
+    local.set("b", 4, 10, 60)
+    assert local.get("b") == 4
+    assert local.size == 50
+
+
+def test_local_cache_skips_oversize_values():
+    local = cache.LocalCache(max_entries=10, max_bytes=100)
+    local.set("a", 1, 10, 60)
+    local.set("a", 2, 101, 60)
+    assert local.get("a") is None
+    assert local.size == 0
+
+
+def test_local_cache_expires_entries():
+    local = cache.LocalCache(max_entries=10, max_bytes=100)
+    local.set("a", 1, 10, 0)
+    local.set("b", 2, 10, 60)
+    assert local.get("a") is None
+    assert local.get("b") == 2
+    assert local.size == 10
+
+
+def test_listen_for_invalidations_discards_published_keys(fake_redis):
+    async def main():
+        listener = asyncio.create_task(cache.listen_for_invalidations())
+        while not (await fake_redis.pubsub_numsub(cache.INVALIDATION_CHANNEL))[0][1]:
+            await asyncio.sleep(0.01)
+        # Let the listener clear the local tier, as it does on every (re)connect, before filling it
+        await asyncio.sleep(0.05)
+        cache.local_cache.set("a", 1, 10, 60)
+        cache.local_cache.set("b", 2, 10, 60)
+        await fake_redis.publish(cache.INVALIDATION_CHANNEL, '["a"]')
+        while cache.local_cache.get("a") is not None:
+            await asyncio.sleep(0.01)
+        listener.cancel()
+        return cache.local_cache.get("b")
+
+    assert asyncio.run(asyncio.wait_for(main(), 5)) == 2
+
+
+def test_entity_fill_skips_entities_changed_since_the_read(monkeypatch):
+    monkeypatch.setattr(cache.fastapi_config, "SQLALCHEMY_REPLICA_URIS", ["postgresql://replica/db"])
+    books = cache.EntityCache("book")
+    replica_session = type("Session", (), {"bind": object()})()
+
+    async def main():
+        since = await cache.change_sequence()
+        await books.set(1, {"id": 1, "title": "new"})
+        # Read before the write
+        await books.fill_many({1: {"id": 1, "title": "old"}, 2: {"id": 2, "title": "two"}}, since, None)
+        # Read after the write, but from a replica that may not have it yet
+        await books.delete(3)
+        await books.fill_many({3: {"id": 3, "title": "deleted"}}, await cache.change_sequence(), replica_session)
+        return await books.get_many([1, 2, 3])
+
+    assert asyncio.run(main()) == {1: {"id": 1, "title": "new"}, 2: {"id": 2, "title": "two"}}
+
+
+def test_cache_it_skips_store_invalidated_during_compute(fake_redis):
+    calls = 0
+
+    @cache.cache_it("test", tags=lambda result, params: [f"book:{params['q']}"])
+    async def endpoint(q: str):
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.1)
+        return calls
+
+    async def main():
+        computing = asyncio.create_task(endpoint(q="1"))
+        await asyncio.sleep(0.05)
+        await cache.invalidate_tags("book:1")
+        first = await computing
+        stored = await fake_redis.exists(cache.cache_key("test", {"q": "1"}))
+        return first, stored, await endpoint(q="1"), await endpoint(q="1")
+
+    assert asyncio.run(main()) == (1, 0, 2, 2)
+
+
+def test_local_copy_expires_with_the_redis_entry(fake_redis):
+    @cache.cache_it("test")
+    async def endpoint(q: str):
+        return "computed"
+
+    async def main():
+        key = cache.cache_key("test", {"q": "x"})
+        entry = {"value": "cached", "fresh_until": time.time() + 60}
+        await fake_redis.set(key, json.dumps(entry), px=100)
+        cached = await endpoint(q="x")
+        await asyncio.sleep(0.15)
+        return cached, cache.local_cache.get(key), await endpoint(q="x")
+
+    assert asyncio.run(main()) == ("cached", None, "computed")
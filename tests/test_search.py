@@ -0,0 +1,32 @@
+import pytest
+
+from tests.factories import AuthorFactory, BookFactory
+
+
+def test_search_ranks_books_and_authors(client, user_headers):
+    book = BookFactory(title="Quixotic Harbour", description="A voyage across the sea")
+    author = AuthorFactory(name="Quixote Marlowe")
+    response = client.get("/search", headers=user_headers, params={"q": "quixotic"})
+    assert response.status_code == 200
+    data = response.json()
+    assert data["books"][0]["id"] == book.id
+    assert data["books"][0]["rank"] > 0
+    assert any(a["id"] == author.id for a in data["authors"])
+
+
+def test_search_matches_description(client, user_headers):
+    book = BookFactory(title="Untitled", description="Lighthouses and the keepers who tended them")
+    response = client.get("/search", headers=user_headers, params={"q": "lighthouse keepers"})
+    assert any(b["id"] == book.id for b in response.json()["books"])
+
+
+def test_search_tolerates_typos(client, user_headers):
+    author = AuthorFactory(name="Wilhelmina Cartwright")
+    response = client.get("/search", headers=user_headers, params={"q": "Wilhelmina Cartrwight"})
+    assert any(a["id"] == author.id for a in response.json()["authors"])
+
+
+@pytest.mark.parametrize("params", [{}, {"q": "a"}])
+def test_search_invalid_query(client, user_headers, params):
+    response = client.get("/search", headers=user_headers, params=params)
+    assert response.status_code == 422
@@ -1,10 +1,22 @@
 import pytest
 
+from api import fastapi_config
+
 
 def test_get_users(client, admin_headers):
     response = client.get("/users", headers=admin_headers)
     assert response.status_code == 200
-    assert isinstance(response.json(), list)
+    assert isinstance(response.json()["items"], list)
+
+
+def test_get_users_forbidden_for_regular_user(client, user_headers):
+    response = client.get("/users", headers=user_headers)
+    assert response.status_code == 403
+
+
+def test_invalid_token(client):
+    response = client.get("/books", headers={"Authorization": "Bearer not-a-token"})
+    assert response.status_code == 401
 
 
 def test_create_user(client, admin_headers):
@@ -39,6 +51,12 @@ def test_update_user(client, admin_headers, regular_user, payload, expected_stat
     assert response.status_code == expected_status
 
 
+def test_update_user_password_hashing_busy(client, admin_headers, regular_user, monkeypatch):
+    monkeypatch.setattr(fastapi_config, "HASHING_MAX_QUEUE", 0)
+    response = client.put(f"/users/{regular_user.id}", headers=admin_headers, json={"password": "changed"})
+    assert response.status_code == 503
+
+
 def test_update_user_not_found(client, admin_headers):
     response = client.put("/users/99999", headers=admin_headers, json={"name": "Ghost"})
     assert response.status_code == 404